@@ -0,0 +1,78 @@
+"""
+Synthetic inputs for benchmarks: html documents of a given size and CDX index rows.
+Generated with a fixed seed so runs on different commits measure the same input.
+"""
+import datetime as dt
+import random
+import re
+
+TAGS = ["div", "p", "span", "section", "article", "ul", "li", "table", "tr", "td", "a", "b"]
+TIMESTAMP_FORMAT = "%Y%m%d%H%M%S"
+
+
+def html_page(size: int, seed: int = 0) -> str:
+    """
+    Typical page: paragraphs, links, images and comments, roughly size characters, valid structure.
+    """
+    rng = random.Random(seed)
+    parts = ["<!DOCTYPE html><html><head><title>bench</title><meta charset=utf-8></head><body>"]
+    length = len(parts[0])
+    while length < size:
+        tag = rng.choice(TAGS)
+        words = " ".join(rng.choice(["lorem", "ipsum", "dolor", "sit", "amet"]) for _ in range(rng.randint(5, 40)))
+        block = f'<{tag} class="c{rng.randint(0, 99)}">{words}<a href="/x/{rng.randint(0, 10 ** 6)}">link</a>' \
+                f'<img src="i.png"><br><!-- note {rng.randint(0, 99)} --></{tag}>\n'
+        parts.append(block)
+        length += len(block)
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def deep_nesting(depth: int) -> str:
+    """
+    depth nested divs (large tag stack).
+    """
+    return "<html><body>" + "<div>" * depth + "x" + "</div>" * depth + "</body></html>"
+
+
+def huge_script(size: int) -> str:
+    """
+    Page with one inline script of about size characters full of tag-like strings
+    (has to be skipped as raw text).
+    """
+    line = 'var s = "<div><p>" + x + "</span>"; if (a < b && c > d) { f("<!-- -->"); }\n'
+    body = line * (size // len(line) + 1)
+    return f"<html><head><script>{body}</script></head><body><p>text</p></body></html>"
+
+
+def many_scripts(size: int) -> str:
+    """
+    Valid page with a small inline script on every line (many raw text blocks to skip).
+    """
+    line = '<p>text</p><script>var a = "<b>";</script>\n'
+    return "<html><body>\n" + line * (size // len(line) + 1) + "</body></html>"
+
+
+def malformed(size: int, error_rate: float = 0.01, seed: int = 0) -> str:
+    """
+    html_page with a fraction of closing tags dropped or swapped (many structure errors).
+    """
+    rng = random.Random(seed)
+
+    def corrupt(match):
+        if rng.random() >= error_rate:
+            return match.group(0)
+        return rng.choice(["", "</span>"])
+
+    return re.sub(r"</\w+>", corrupt, html_page(size, seed))
+
+
+def cdx_rows(count: int, start_year: int = 2015, years: int = 10, seed: int = 0) -> list:
+    """
+    count capture timestamps (yyyymmddhhmmss strings) spread over years, sorted like a CDX index.
+    """
+    rng = random.Random(seed)
+    start = dt.datetime(start_year, 1, 1)
+    span = int((dt.datetime(start_year + years, 1, 1) - start).total_seconds())
+    offsets = sorted(rng.randrange(span) for _ in range(count))
+    return [(start + dt.timedelta(seconds=offset)).strftime(TIMESTAMP_FORMAT) for offset in offsets]
@@ -0,0 +1,177 @@
+"""
+Local stand-in for the Wayback Machine (CDX index + snapshots) with injectable latency and errors,
+for load testing fetch_archive / tuning rate limits offline.
+
+    python -m benchmarks.mockarchive --port 8080 --rows 100000 --latency 0.05 --throttle_rate 0.05
+    python parse_archive.py https://example.com -day_of_week 1 -archive_base http://127.0.0.1:8080
+"""
+import random
+import threading
+import time
+from argparse import ArgumentParser
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks import generators
+
+
+class Faults:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, throttle_rate: float = 0.0,
+                 error_rate: float = 0.0, max_rate: float = None, retry_after: int = 1, seed: int = 0):
+        """
+        :param latency: seconds added to every response (plus uniform 0..jitter)
+        :param throttle_rate: fraction of requests answered 429 with Retry-After: retry_after
+        :param error_rate: fraction of requests answered 500/502/503/504
+        :param max_rate: requests per second above which the server answers 429 (like the real archive)
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.max_rate = max_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.recent = deque()
+        self.lock = threading.Lock()
+
+    def delay(self) -> float:
+        with self.lock:
+            return self.latency + self.random.uniform(0, self.jitter)
+
+    def status(self) -> int:
+        """
+        200 or the error status to answer this request with.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.recent.append(now)
+            while self.recent[0] < now - 1:
+                self.recent.popleft()
+            if self.max_rate and len(self.recent) > self.max_rate:
+                return 429
+            draw = self.random.random()
+            if draw < self.throttle_rate:
+                return 429
+            if draw < self.throttle_rate + self.error_rate:
+                return self.random.choice([500, 502, 503, 504])
+            return 200
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    """
+    GET /cdx/search/cdx -> plain text index (timestamp per line, blank line + resume key if more),
+    GET /web/<timestamp>/<url> -> synthetic snapshot page.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        archive = self.server.archive
+        time.sleep(archive.faults.delay())
+        status = archive.faults.status()
+        archive.count(status)
+        if status != 200:
+            headers = {"Retry-After": str(archive.faults.retry_after)} if status == 429 else {}
+            return self._send(status, b"", headers)
+
+        split = urlsplit(self.path)
+        if split.path == "/cdx/search/cdx":
+            return self._send(200, archive.cdx(parse_qs(split.query)).encode(), {"Content-Type": "text/plain"})
+        if split.path.startswith("/web/"):
+            archive.count("snapshot")
+            return self._send(200, archive.page, {"Content-Type": "text/html"})
+        self._send(404, b"")
+
+    def _send(self, status: int, body: bytes, headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockArchive:
+    def __init__(self, rows: int = 10_000, page_size: int = 50_000, faults: Faults = None, port: int = 0):
+        """
+        Serves rows synthetic captures (for any url) in a background thread while used as context manager,
+        point fetch_archive.configure_archive() to base_url.
+        """
+        self.timestamps = generators.cdx_rows(rows)
+        self.page = generators.html_page(page_size).encode()
+        self.faults = faults or Faults()
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), ArchiveHandler)
+        self.server.daemon_threads = True
+        self.server.archive = self
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def count(self, key) -> None:
+        with self.stats_lock:
+            self.stats[key] += 1
+            if key != "snapshot":
+                self.stats["requests"] += 1
+
+    def cdx(self, query: dict) -> str:
+        """
+        Supports the parameters fetch_archive sends: from, to, collapse=timestamp:N, limit, resumeKey.
+        """
+        def value(name):
+            return query.get(name, [None])[0]
+
+        start = (value("from") or "").ljust(14, "0")
+        end = (value("to") or "").ljust(14, "9")
+        rows = [ts for ts in self.timestamps if start <= ts <= end]
+
+        collapse = value("collapse")
+        if collapse:
+            digits = int(collapse.split(":")[1])
+            rows = [ts for i, ts in enumerate(rows) if i == 0 or ts[:digits] != rows[i - 1][:digits]]
+
+        offset = int(value("resumeKey") or 0)
+        limit = int(value("limit") or len(rows))
+        page = rows[offset:offset + limit]
+        text = "".join(f"{ts}\n" for ts in page)
+        if value("showResumeKey") == "true" and offset + limit < len(rows):
+            text += f"\n{offset + limit}\n"
+        return text
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def parse_args():
+    parser = ArgumentParser(description="Local Wayback Machine stand-in with injectable latency and errors.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rows", type=int, default=10_000, help="Number of captures in the index.")
+    parser.add_argument("--page_size", type=int, default=50_000, help="Snapshot size in bytes.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many seconds added on top of latency.")
+    parser.add_argument("--throttle_rate", type=float, default=0.0, help="Fraction of requests answered 429.")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests answered 5xx.")
+    parser.add_argument("--max_rate", type=float, help="Requests per second above which 429 is answered.")
+    parser.add_argument("--retry_after", type=int, default=1, help="Retry-After seconds sent with 429.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    faults = Faults(latency=args.latency, jitter=args.jitter, throttle_rate=args.throttle_rate,
+                    error_rate=args.error_rate, max_rate=args.max_rate, retry_after=args.retry_after)
+    with MockArchive(rows=args.rows, page_size=args.page_size, faults=faults, port=args.port) as archive:
+        print(f"Serving mock archive on {archive.base_url}, Ctrl+C to stop")
+        try:
+            archive.thread.join()
+        except KeyboardInterrupt:
+            print(dict(archive.stats))
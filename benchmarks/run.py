@@ -0,0 +1,193 @@
+"""
+Runs the benchmarks and records results as JSON, so runs on different commits can be compared.
+
+    python -m benchmarks.run                          # all benchmarks, results/<commit>.json
+    python -m benchmarks.run --quick --only validator
+    python -m benchmarks.run --baseline benchmarks/results/<older commit>.json
+"""
+import datetime as dt
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+
+from benchmarks import generators
+from benchmarks.server import LocalServer
+from src import fetch_archive, fetchmany, snapshotselect, validatehtml
+
+RESULTS_DIR = Path(__file__).parent / "results"
+MB = 1024 * 1024
+
+
+def timed(func, repeat: int = 3) -> float:
+    """
+    Best of repeat runs (seconds), least disturbed by other load on the machine.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_validator(quick: bool) -> list:
+    size = 100_000 if quick else 2 * MB
+    documents = {"page": generators.html_page(size),
+                 "deep_nesting": generators.deep_nesting(size // 11),
+                 "huge_script": generators.huge_script(size),
+                 "many_scripts": generators.many_scripts(size),
+                 "malformed": generators.malformed(size)}
+
+    def feed(content, chunk_size=64 * 1024, full_check=True):
+        checker = validatehtml.ChkHtmlStructure(full_check=full_check)
+        for i in range(0, len(content), chunk_size):
+            checker.feed(content[i:i + chunk_size])
+        checker.close()
+
+    def legacy(content):
+        # check before the single pass scanner: comments and scripts removed by re.sub, then one finditer
+        checker = validatehtml.ChkHtmlStructure()
+        content = re.sub(r"<!--.*?-->", "", content, flags=re.DOTALL)
+        content = re.sub(r"<script.*?</script>|<style.*?</style>", "", content, flags=re.DOTALL)
+        for match in re.finditer(r"<(/?\w+)[^>]*>", content):
+            checker._process_tag(match.group(1).lower())
+        return checker._process_outcome()
+
+    results = []
+    for kind, document in documents.items():
+        encoded = document.encode()
+        modes = {"legacy": lambda: legacy(document),
+                 "str": lambda: validatehtml.ChkHtmlStructure().run_checks(document),
+                 "bytes": lambda: validatehtml.ChkHtmlStructure().run_checks(encoded),
+                 "feed": lambda: feed(encoded)}
+        if kind in ("malformed", "many_scripts"):
+            modes["fail_fast"] = lambda: validatehtml.ChkHtmlStructure(full_check=False).run_checks(encoded)
+        for mode, func in modes.items():
+            seconds = timed(func)
+            results.append({"name": f"validator.{kind}.{mode}", "size": len(encoded), "seconds": seconds,
+                            "mb_per_s": len(encoded) / MB / seconds})
+    return results
+
+
+def bench_selection(quick: bool) -> list:
+    args = Namespace(day_of_week=1, day_of_month=None, time_of_day=50)
+    start_date, end_date = dt.date(2016, 1, 1), dt.date(2023, 12, 31)
+
+    def legacy(rows):
+        timestamps = [dt.datetime.strptime(ts, fetch_archive.TIMESTAMP_FORMAT) for ts in rows]
+        timestamps = fetch_archive.filter_date_range(timestamps, start_date, end_date)
+        groups = fetch_archive.group_snapshots(timestamps, args)
+        return [fetch_archive.choose_closest(group, args.time_of_day) for group in groups.values()]
+
+    def arrays(rows):
+        epochs = snapshotselect.filter_range(snapshotselect.parse_timestamps(rows), start_date, end_date)
+        return snapshotselect.select(epochs, args.day_of_week, args.day_of_month, args.time_of_day)
+
+    results = []
+    for count in ([10_000] if quick else [10_000, 100_000, 1_000_000]):
+        rows = generators.cdx_rows(count)
+        implementations = {"arrays": arrays}
+        if count <= 100_000:  # legacy selection takes many seconds on 1M rows
+            implementations["legacy"] = legacy
+        for implementation, func in implementations.items():
+            seconds = timed(lambda: func(rows), repeat=1 if count >= 1_000_000 else 3)
+            results.append({"name": f"selection.{implementation}.{count}", "rows": count, "seconds": seconds,
+                            "rows_per_s": count / seconds})
+    return results
+
+
+def bench_fetch(quick: bool) -> list:
+    count = 20 if quick else 200
+    page_size = 100_000
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir, LocalServer(page_size=page_size, compress=True) as server:
+        urls = [f"{server.base_url}/page{i}.html" for i in range(count)]
+        for concurrency in (1, 8, 16):
+            for mode, options in {"memory": {}, "stream": {"stream": True},
+                                  "keep_encoding": {"keep_encoding": True}}.items():
+                def fetch():
+                    fetched = fetchmany.fetch_many(urls, add_timestamp=False, output_dir=tmp_dir,
+                                                   concurrency=concurrency, **options)
+                    failed = [result for result in fetched.values() if isinstance(result, Exception)]
+                    if failed:
+                        raise failed[0]
+                seconds = timed(fetch, repeat=1)
+                results.append({"name": f"fetch.{mode}.concurrency{concurrency}", "pages": count,
+                                "seconds": seconds, "pages_per_s": count / seconds,
+                                "mb_per_s": count * page_size / MB / seconds})
+    return results
+
+
+BENCHMARKS = {"validator": bench_validator, "selection": bench_selection, "fetch": bench_fetch}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "time": dt.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "numpy": snapshotselect.np is not None, "cpus": os.cpu_count()}
+
+
+def compare(results: list, baseline: dict) -> None:
+    """
+    Prints seconds per benchmark next to the baseline run, speedup > 1 means faster than baseline.
+    """
+    previous = {result["name"]: result["seconds"] for result in baseline["results"]}
+    print(f"{'benchmark':45} {'seconds':>10} {'baseline':>10} {'speedup':>8}")
+    for result in results:
+        name, seconds = result["name"], result["seconds"]
+        if name in previous:
+            print(f"{name:45} {seconds:10.4f} {previous[name]:10.4f} {previous[name] / seconds:8.2f}")
+        else:
+            print(f"{name:45} {seconds:10.4f} {'-':>10} {'-':>8}")
+
+
+def parse_args():
+    parser = ArgumentParser(description="Run benchmarks and record results as JSON.")
+    parser.add_argument("--only", help=f"Comma separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="Small inputs, for a fast sanity run.")
+    parser.add_argument("--output", help="Results file, defaults to benchmarks/results/<commit>.json")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare against.")
+    arguments = parser.parse_args()
+    arguments.benchmarks = arguments.only.split(",") if arguments.only else list(BENCHMARKS)
+    unknown = set(arguments.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    return arguments
+
+
+def main():
+    args = parse_args()
+    run = environment()
+    run["quick"] = args.quick
+    run["results"] = []
+    for name in args.benchmarks:
+        print(f"Running {name} benchmarks", file=sys.stderr)
+        run["results"].extend(BENCHMARKS[name](args.quick))
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{run['commit'] or 'unknown'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(run, indent=2) + "\n")
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.baseline:
+        compare(run["results"], json.loads(Path(args.baseline).read_text()))
+    else:
+        for result in run["results"]:
+            print(f"{result['name']:45} {result['seconds']:10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Local HTTP stand-in for benchmarks: serves synthetic pages, so fetch throughput is measured
+without depending on (or hammering) real sites.
+"""
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks import generators
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """
+    GET /<anything> -> the server's page (gzip encoded if the client accepts it).
+    """
+    protocol_version = "HTTP/1.1"  # keep-alive, like real servers
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def do_GET(self):
+        body = self.server.page
+        encoding = None
+        if self.server.gzip_page is not None and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body, encoding = self.server.gzip_page, "gzip"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServer:
+    def __init__(self, handler=PageHandler, page_size: int = 100_000, compress: bool = False):
+        """
+        Runs in a background thread while used as context manager, base_url points to it.
+        :param compress: page is sent gzip encoded to clients accepting it
+        """
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.server.page = generators.html_page(page_size).encode()
+        self.server.gzip_page = gzip.compress(self.server.page) if compress else None
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
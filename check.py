@@ -1,17 +1,22 @@
 """
 Script to call via command line to QC the file (downloaded via fetch.py).
 """
+import sys
 from argparse import ArgumentParser
 
+from src import batchcheck, metrics
 from src.filecheck import FileCheck
 
 
 def parse_args():
     parser = ArgumentParser(description="Check downloaded html file for potential corruption.")
 
-    parser.add_argument("--file",
-                        help="Path to file that is to be checked.",
-                        required=True)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--file",
+                        help="Path to file that is to be checked.")
+    target.add_argument("--batch",
+                        help="Directory or glob pattern of files to check in one run, "
+                        "e.g.\n--batch 'data/Archive/*.html'")
     parser.add_argument("--tol", type=float, default=0.05,
                         help="Acceptable difference between files in float."
                         "e.g., for 15% acceptable difference \n--tol 0.15"
@@ -24,6 +29,23 @@ def parse_args():
     parser.add_argument("--against_site",
                         help="Download content from url to check against."
                         "e.g.\n--against_site somewebsite.com/page-1.html")
+    parser.add_argument("--fast_size", action="store_true",
+                        help="With --against_site: only ask the site for the page size (HEAD / ranged request) "
+                        "instead of downloading the page.")
+    parser.add_argument("--fail_fast", action="store_true",
+                        help="Only decide pass/fail: stop at the first issue of a file "
+                        "(html check reports line and offset of the first error).")
+    parser.add_argument("--workers", type=int,
+                        help="Number of processes used with --batch. Defaults to number of cpus.")
+    parser.add_argument("--report_format", choices=["json", "csv"], default="json",
+                        help="Format of --batch report.")
+    parser.add_argument("--report",
+                        help="File to write --batch report into. Defaults to stdout.")
+    parser.add_argument("--metrics",
+                        help="File to record check timings (html check time per MB, requests to sites) into.")
+    parser.add_argument("--metrics_format", choices=metrics.FORMATS, default="jsonl",
+                        help="jsonl: one line per check / request, written while running. "
+                        "prometheus: totals in Prometheus text format, written at the end.")
 
     arguments = parser.parse_args()
     checks = {}
@@ -35,6 +57,28 @@ def parse_args():
     return arguments
 
 
+def run_batch(arguments) -> bool:
+    files = batchcheck.collect_files(arguments.batch)
+    results = batchcheck.run_batch(files, arguments.check_types, tolerance=arguments.tol, workers=arguments.workers,
+                                   fast_size=arguments.fast_size, fail_fast=arguments.fail_fast)
+    if arguments.report:
+        with open(arguments.report, "w", newline="") as report:
+            batchcheck.write_report(results, report, arguments.report_format)
+    else:
+        batchcheck.write_report(results, sys.stdout, arguments.report_format)
+    return all(result["passed"] for result in results)
+
+
 if __name__ == "__main__":
     args = parse_args()
-    FileCheck(args.file, check_type=args.check_types, tolerance=args.tol).run_checks()
+    metrics.start(args.metrics, args.metrics_format)
+    try:
+        if args.batch:
+            succeeded = run_batch(args)
+        else:
+            FileCheck(args.file, check_type=args.check_types, tolerance=args.tol, fast_size=args.fast_size,
+                      fail_fast=args.fail_fast).run_checks()
+            succeeded = True
+    finally:
+        metrics.finish(args.metrics, args.metrics_format)
+    sys.exit(0 if succeeded else 1)
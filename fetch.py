@@ -2,28 +2,92 @@
 Script to call via command line for downloading content of website url to local file.
 """
 
+import logging
+import sys
 from argparse import ArgumentParser
 
-from src.fetchsite import FetchSite
+from src import compression, fetchmany, metrics
+from src.httpcache import MetadataStore
+from src.storage import BlobStore
 
 
 def parse_args():
     parser = ArgumentParser(description="Downloading website content to local file.")
-    parser.add_argument("--url",
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url",
                         help="Url of website to be downloaded.")
+    target.add_argument("--url_file",
+                        help="File with urls to download in one run (one per line), - to read from stdin.")
     parser.add_argument("--output_file",
                         help="Name of output. If left empty autogenerated.")
     parser.add_argument("--timestamp", action="store_true",
                         help="Adds timestamp of download to filename.")
     parser.add_argument("--output_dir",
                         help="Directory into which file is to be saved. Defaults to run location.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Write content to file while downloading instead of keeping it in memory.")
+    parser.add_argument("--cache",
+                        help="Metadata file (json) for conditional requests. Unchanged pages are not saved again.")
+    parser.add_argument("--link_unchanged", choices=["hard", "symlink"],
+                        help="With --cache: link unchanged page to previously saved file instead of skipping it.")
+    parser.add_argument("--store",
+                        help="Directory of a deduplicating store: each distinct page content is saved once, "
+                        "saved files are hard links to it.")
+    parser.add_argument("--compress", choices=compression.available_codecs(),
+                        help="Save content compressed, saved file names get the codec suffix (.gz, .zst).")
+    parser.add_argument("--keep_encoding", action="store_true",
+                        help="Ask for a gzip/zstd compressed page and save it as received, without decoding it "
+                        "(saved file names get .gz/.zst suffix, implies --stream).")
+    parser.add_argument("--concurrency", type=int, default=fetchmany.DEFAULT_CONCURRENCY,
+                        help="With --url_file: max number of downloads at the same time.")
+    parser.add_argument("--per_host", type=int, default=fetchmany.DEFAULT_PER_HOST,
+                        help="With --url_file: max number of downloads at the same time from one host.")
+    parser.add_argument("--metrics",
+                        help="File to record request timings (connect, time to first byte, total) and sizes into.")
+    parser.add_argument("--metrics_format", choices=metrics.FORMATS, default="jsonl",
+                        help="jsonl: one line per request, written while running. "
+                        "prometheus: totals per host in Prometheus text format, written at the end.")
 
     arguments = parser.parse_args()
+    if arguments.url_file and arguments.output_file:
+        parser.error("--output_file can only be used with --url")
+    if arguments.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if arguments.per_host < 1:
+        parser.error("--per_host must be at least 1")
     return arguments
 
 
+def fetch_url_file(arguments, cache, store) -> bool:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    urls = fetchmany.read_urls(arguments.url_file)
+    results = fetchmany.fetch_many(urls, add_timestamp=arguments.timestamp, output_dir=arguments.output_dir,
+                                   stream=arguments.stream, cache=cache, link_unchanged=arguments.link_unchanged,
+                                   store=store, compress=arguments.compress, keep_encoding=arguments.keep_encoding,
+                                   concurrency=arguments.concurrency, per_host=arguments.per_host)
+    failed = {url: result for url, result in results.items() if isinstance(result, Exception)}
+    for url, error in failed.items():
+        logging.error(f"Failed to fetch {url}: {error}")
+    logging.info(f"Fetched {len(results) - len(failed)} of {len(results)} urls")
+    return not failed
+
+
 if __name__ == "__main__":
     args = parse_args()
-    FetchSite(args.url).download_content().to_file(add_timestamp=args.timestamp,
-                                                   file_name=args.output_file,
-                                                   output_dir=args.output_dir)
+    cache = MetadataStore(args.cache) if args.cache else None
+    store = BlobStore(args.store, compress=args.compress) if args.store else None
+    metrics.start(args.metrics, args.metrics_format)
+    succeeded = True
+    try:
+        if args.url_file:
+            succeeded = fetch_url_file(args, cache, store)
+        else:
+            fetchmany.fetch_url(args.url, add_timestamp=args.timestamp, file_name=args.output_file,
+                                output_dir=args.output_dir, stream=args.stream, cache=cache,
+                                link_unchanged=args.link_unchanged, store=store, compress=args.compress,
+                                keep_encoding=args.keep_encoding)
+    finally:
+        if cache:
+            cache.save()
+        metrics.finish(args.metrics, args.metrics_format)
+    sys.exit(0 if succeeded else 1)
@@ -1,6 +1,7 @@
 import argparse
 import os
 
+from src import compression, metrics
 from src.fetch_archive import fetch_from_archive
 
 def parse_args():
@@ -21,6 +22,40 @@ def parse_args():
     parser.add_argument("-start_date", help="In format yyyy-mm-dd")
     parser.add_argument("-end_date", help="In format yyyy-mm-dd")
 
+    parser.add_argument("-workers", type=int, default=1,
+                        help="Number of snapshots downloaded in parallel")
+    parser.add_argument("-rate", type=float, default=None,
+                        help="Max requests per second across all workers, defaults to one per 1.5s")
+    parser.add_argument("-max_rate", type=float, default=None,
+                        help="Rate may be raised up to this while archive responds fine, defaults to -rate. "
+                        "Rate is lowered automatically when archive throttles (429/503)")
+    parser.add_argument("-retries", type=int, default=5,
+                        help="Number of retries of a failed request (connection error, 429, 5xx)")
+
+    parser.add_argument("-collapse", type=int, default=None,
+                        help="Let archive keep only the first capture per N digit timestamp prefix "
+                        "(8 = per day, 10 = per hour, 12 = per minute). Smaller index, "
+                        "but -time_of_day is matched at that precision")
+
+    parser.add_argument("-cache_dir", default=None,
+                        help="Directory of the snapshot index cache, defaults to .cdx_cache in output_dir")
+
+    parser.add_argument("-store", default=None,
+                        help="Directory of a deduplicating store: identical snapshots are saved once, "
+                        "snapshot files are hard links to it")
+    parser.add_argument("-compress", choices=compression.available_codecs(), default=None,
+                        help="Save snapshots compressed, file names get the codec suffix (.gz, .zst)")
+
+    parser.add_argument("-archive_base", default=None,
+                        help="Base url of a Wayback compatible server to use instead of https://web.archive.org "
+                        "(e.g. local python -m benchmarks.mockarchive)")
+
+    parser.add_argument("-metrics", default=None,
+                        help="File to record request timings, retries and rate limit waits into")
+    parser.add_argument("-metrics_format", choices=metrics.FORMATS, default="jsonl",
+                        help="jsonl: one line per request, written while running. "
+                        "prometheus: totals in Prometheus text format, written at the end")
+
     parser.add_argument("-verbose", action="store_true")
 
     args = parser.parse_args()
@@ -40,8 +75,27 @@ def parse_args():
     if not (0 <= args.time_of_day <= 100):
         raise ValueError("time_of_day must be 0-100")
 
+    if args.collapse is not None and not (8 <= args.collapse <= 14):
+        raise ValueError("collapse must be 8-14")
+
+    if args.workers < 1:
+        raise ValueError("workers must be at least 1")
+
+    if args.rate is not None and args.rate <= 0:
+        raise ValueError("rate must be positive")
+
+    if args.max_rate is not None and args.max_rate <= 0:
+        raise ValueError("max_rate must be positive")
+
+    if args.retries < 0:
+        raise ValueError("retries must be 0 or more")
+
     return args
 
 if __name__ == "__main__":
     args = parse_args()
-    fetch_from_archive(args)
\ No newline at end of file
+    metrics.start(args.metrics, args.metrics_format)
+    try:
+        fetch_from_archive(args)
+    finally:
+        metrics.finish(args.metrics, args.metrics_format)
\ No newline at end of file
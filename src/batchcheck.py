@@ -0,0 +1,83 @@
+"""
+Run FileCheck over many files (directory or glob) in a process pool and report results
+"""
+import csv
+import glob
+import json
+import os
+from itertools import repeat
+from pathlib import Path
+from typing import List, TextIO
+
+from src import metrics
+from src.filecheck import FileCheck
+
+REPORT_FIELDS = ["file", "passed", "issues"]
+
+
+def collect_files(target: str) -> List[str]:
+    """
+    :param target: directory (every non-hidden file directly in it) or glob pattern (** supported)
+    """
+    if os.path.isdir(target):
+        paths = [str(path) for path in Path(target).iterdir()
+                 if path.is_file() and not path.name.startswith(".")]
+    else:
+        paths = [path for path in glob.glob(target, recursive=True) if os.path.isfile(path)]
+    return sorted(paths)
+
+
+def check_file(file_path: str, check_type: dict, tolerance: float, fast_size: bool = False,
+               fail_fast: bool = False) -> dict:
+    result = {"file": file_path, "passed": True, "issues": []}
+    try:
+        FileCheck(file_path, check_type=check_type, tolerance=tolerance, fast_size=fast_size,
+                  fail_fast=fail_fast).run_checks()
+    except Exception as e:
+        result["passed"] = False
+        issues = e.args[0] if e.args and isinstance(e.args[0], list) else [repr(e)]
+        result["issues"] = [issue if isinstance(issue, str) else str(issue) for issue in issues]
+    return result
+
+
+def run_batch(files: List[str], check_type: dict, tolerance: float = 0.05, workers: int = None,
+              fast_size: bool = False, fail_fast: bool = False) -> List[dict]:
+    """
+    Checks files in parallel, results are returned in the order of files.
+    """
+    if not files:
+        return []
+    from concurrent.futures import ProcessPoolExecutor  # multiprocessing is only imported for --batch
+
+    workers = workers or os.cpu_count() or 1
+    # bigger chunks -> less inter-process traffic for thousands of small tasks
+    chunksize = max(1, len(files) // (workers * 4))
+    recorder = metrics.get_metrics()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=metrics.configure_metrics,
+                             initargs=(recorder.events_path,)) as executor:
+        for result, samples in executor.map(_check_and_collect, files, repeat(check_type), repeat(tolerance),
+                                            repeat(fast_size), repeat(fail_fast), chunksize=chunksize):
+            recorder.merge(samples)
+            results.append(result)
+    return results
+
+
+def write_report(results: List[dict], output: TextIO, report_format: str = "json") -> None:
+    if report_format == "json":
+        json.dump(results, output, indent=2)
+        output.write("\n")
+    elif report_format == "csv":
+        writer = csv.DictWriter(output, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow({**result, "issues": "; ".join(result["issues"])})
+    else:
+        raise ValueError(f"Unknown report format: {report_format}")
+
+
+def _check_and_collect(*args) -> tuple:
+    """
+    check_file in a worker process, with the metrics it collected (merged into the metrics of the caller).
+    """
+    return check_file(*args), metrics.get_metrics().drain()
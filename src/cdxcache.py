@@ -0,0 +1,49 @@
+"""
+On-disk cache of CDX index rows (capture timestamps), so repeated backfills only ask for new captures
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+TIMESTAMP_LENGTH = 14  # yyyymmddhhmmss
+
+
+class IndexCache:
+    def __init__(self, cache_dir: Union[str, Path], url: str, params: Optional[dict] = None,
+                 cdx_url: Optional[str] = None):
+        """
+        :param params: CDX query parameters that change the result set (filter, ...), part of the cache key
+        :param cdx_url: index server the rows come from, part of the cache key
+        """
+        key = json.dumps({"url": url, "params": params or {}, "cdx_url": cdx_url}, sort_keys=True)
+        self.path = Path(cache_dir) / f"{hashlib.sha1(key.encode()).hexdigest()}.txt"
+        self.last_timestamp = None
+        self.needs_newline = False
+
+    def load(self) -> List[str]:
+        """
+        Cached timestamps in the order they were received (ascending).
+        """
+        if not self.path.exists():
+            return []
+        with open(self.path) as file:
+            data = file.read()
+        self.needs_newline = bool(data) and not data.endswith("\n")
+        # a row cut short by an interrupted run is dropped (and fetched again)
+        timestamps = [ts for ts in data.split() if len(ts) == TIMESTAMP_LENGTH]
+        if timestamps:
+            self.last_timestamp = timestamps[-1]
+        return timestamps
+
+    def append(self, timestamps: Iterable[str]) -> None:
+        timestamps = list(timestamps)
+        if not timestamps:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as file:
+            if self.needs_newline:
+                file.write("\n")
+                self.needs_newline = False
+            file.write("\n".join(timestamps) + "\n")
+        self.last_timestamp = timestamps[-1]
@@ -0,0 +1,143 @@
+"""
+Compression codecs for saved pages: gzip (stdlib) and zstd (if zstandard is installed).
+Compressed files are recognized by suffix or magic bytes and read back transparently.
+"""
+import gzip
+import os
+import struct
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+READ_SIZE = 64 * 1024  # bytes
+# gzip stores the size modulo 4 GiB and deflate compresses at most ~1032:1,
+# so the trailer is exact for files below 4 GiB / 1032
+GZIP_TRAILER_LIMIT = 4 * 1024 ** 3 // 1032
+
+
+class Codec(NamedTuple):
+    name: str
+    suffix: str
+    magic: bytes
+
+
+GZIP = Codec("gzip", ".gz", b"\x1f\x8b")
+ZSTD = Codec("zstd", ".zst", b"\x28\xb5\x2f\xfd")
+CODECS = {codec.name: codec for codec in (GZIP, ZSTD)}
+
+
+def available_codecs() -> List[str]:
+    return [name for name in CODECS if name != ZSTD.name or zstandard is not None]
+
+
+def get_codec(name: str) -> Codec:
+    if name not in available_codecs():
+        raise ValueError(f"Compression {name} is not available (available: {', '.join(available_codecs())})")
+    return CODECS[name]
+
+
+def saved_encodings() -> List[str]:
+    """
+    Content-Encodings a response body can be saved as, without decoding it (best compression first).
+    """
+    return [name for name in (ZSTD.name, GZIP.name) if name in available_codecs()]
+
+
+def codec_for_encoding(content_encoding: Optional[str]) -> Optional[Codec]:
+    """
+    Codec a response body sent with this Content-Encoding can be saved as without decoding it.
+    """
+    name = {"gzip": GZIP.name, "x-gzip": GZIP.name, "zstd": ZSTD.name}.get((content_encoding or "").strip().lower())
+    if name in available_codecs():
+        return CODECS[name]
+    return None
+
+
+def compressed_path(path: Union[str, Path], name: Optional[str]) -> Path:
+    """
+    path with the codec suffix added (unless it is already there), unchanged if name is None.
+    """
+    path = Path(path)
+    if name is None:
+        return path
+    suffix = get_codec(name).suffix
+    return path if path.name.endswith(suffix) else path.with_name(path.name + suffix)
+
+
+def detect(path: Union[str, Path]) -> Optional[Codec]:
+    """
+    Codec of a saved file from its suffix, or from its first bytes. None for plain (and missing) files.
+    """
+    path = Path(path)
+    for codec in CODECS.values():
+        if path.name.endswith(codec.suffix):
+            return codec
+    if not path.is_file():
+        return None
+    with open(path, "rb") as file:
+        start = file.read(4)
+    for codec in CODECS.values():
+        if start.startswith(codec.magic):
+            return codec
+    return None
+
+
+def writer(file, name: str, size: Optional[int] = None):
+    """
+    Compressing file object writing into binary file, close() finishes the stream but leaves file open.
+    :param size: content size if known up front, stored in the zstd frame header
+    """
+    codec = get_codec(name)
+    if codec is GZIP:
+        return gzip.GzipFile(fileobj=file, mode="wb", mtime=0)
+    return zstandard.ZstdCompressor().stream_writer(file, size=-1 if size is None else size, closefd=False)
+
+
+def open_read(path: Union[str, Path]):
+    """
+    Binary file object with the decompressed content of path (plain files are opened as they are).
+    """
+    codec = detect(path)
+    if codec is None:
+        return open(path, "rb")
+    if codec is GZIP:
+        return gzip.open(path, "rb")
+    if zstandard is None:
+        raise ValueError(f"{path} is zstd compressed, install zstandard to read it")
+    return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+
+
+def content_size(path: Union[str, Path]) -> int:
+    """
+    Uncompressed size of a saved file, read from the gzip trailer / zstd frame header when possible,
+    otherwise counted by decompressing the stream (content is never held in memory).
+    """
+    codec = detect(path)
+    if codec is None:
+        return os.stat(path).st_size
+    size = _header_size(path, codec)
+    if size is not None:
+        return size
+    with open_read(path) as file:
+        return sum(len(chunk) for chunk in iter(lambda: file.read(READ_SIZE), b""))
+
+
+def _header_size(path: Union[str, Path], codec: Codec) -> Optional[int]:
+    with open(path, "rb") as file:
+        if codec is GZIP:
+            # ISIZE trailer of the (single, as written by storage) gzip member
+            if os.fstat(file.fileno()).st_size > GZIP_TRAILER_LIMIT:
+                return None
+            file.seek(-4, os.SEEK_END)
+            return struct.unpack("<I", file.read(4))[0]
+        if zstandard is None:
+            return None
+        try:
+            size = zstandard.frame_content_size(file.read(18))
+        except zstandard.ZstdError:
+            return None
+        return size if size >= 0 else None
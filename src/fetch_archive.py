@@ -7,14 +7,46 @@ import os
 import re
 import time
 import calendar
-import requests
+import itertools
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from src import metrics, session, snapshotselect, storage
+from src.cdxcache import IndexCache
+from src.manifest import DONE, FAILED, MANIFEST_NAME, Manifest
+from src.ratelimit import RateLimiter
+from src.retry import RETRY_STATUSES, THROTTLE_STATUSES, RetryPolicy
 
-CDX_URL = "https://web.archive.org/cdx/search/cdx"
-ARCHIVE_URL = "https://web.archive.org/web/{timestamp}/{url}"
+DEFAULT_ARCHIVE_BASE = "https://web.archive.org"
+ARCHIVE_BASE = DEFAULT_ARCHIVE_BASE  # server in use, recorded with downloads in the manifest
+CDX_URL = ARCHIVE_BASE + "/cdx/search/cdx"
+ARCHIVE_URL = ARCHIVE_BASE + "/web/{timestamp}/{url}"
 
 REQUEST_DELAY = 1.5  # seconds
 
+TIMESTAMP_FORMAT = "%Y%m%d%H%M%S"
+
+CDX_PAGE_SIZE = 10000  # rows per index request
+INDEX_CACHE_DIR = ".cdx_cache"
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def configure_archive(base_url=DEFAULT_ARCHIVE_BASE):
+    """
+    Points index and snapshot requests to another Wayback compatible server
+    (e.g. benchmarks.mockarchive for offline load tests).
+    """
+    global ARCHIVE_BASE, CDX_URL, ARCHIVE_URL
+    base_url = base_url.rstrip("/")
+    ARCHIVE_BASE = base_url
+    CDX_URL = f"{base_url}/cdx/search/cdx"
+    ARCHIVE_URL = f"{base_url}/web/{{timestamp}}/{{url}}"
+
 
 def sanitize_filename(value):
     sanitized = re.sub(r"[^\w\-.]", "_", value)
@@ -29,25 +61,130 @@ def parse_date(value):
     return dt.datetime.strptime(value, "%Y-%m-%d").date()
 
 
-def fetch_snapshots(url):
+def request_with_retry(url, handle, params=None, rate_limiter=None, retry_policy=None):
+    """
+    Streamed GET retried on connection errors and 429/5xx responses, handle(response) is called
+    on the successful response and its result returned.
+    Throttling responses slow down the shared rate limiter (and pause it for Retry-After),
+    successful ones let it speed up again.
+    """
+    retry_policy = retry_policy or RetryPolicy()
+    recorder = metrics.get_metrics()
+
+    for attempt in itertools.count():
+
+        if rate_limiter is not None:
+            recorder.observe("rate_limit_wait_seconds", rate_limiter.acquire())
+
+        start = time.perf_counter()
+        try:
+            with session.get_session().get(url, params=params, stream=True) as r:
+                if r.status_code not in RETRY_STATUSES:
+                    r.raise_for_status()
+                    result = handle(r)
+                    metrics.record_request(r, start, attempt=attempt)
+                    if rate_limiter is not None:
+                        rate_limiter.recover()
+                    return result
+
+                metrics.record_request(r, start, attempt=attempt)
+                error = requests.HTTPError(f"{r.status_code} {r.reason} for url: {r.url}", response=r)
+                delay = retry_policy.delay(attempt, r.headers.get("Retry-After"))
+                if rate_limiter is not None and r.status_code in THROTTLE_STATUSES:
+                    rate_limiter.throttle()
+                    rate_limiter.pause(delay)
+
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            error = e
+            delay = retry_policy.delay(attempt)
+            recorder.increment("request_errors_total", error=type(e).__name__)
+
+        if attempt >= retry_policy.max_retries:
+            raise error
+
+        logging.warning(f"{error}, retry {attempt + 1}/{retry_policy.max_retries} in {delay:.1f}s")
+        recorder.increment("retries_total")
+        recorder.observe("retry_sleep_seconds", delay)
+        time.sleep(delay)
+
+
+def read_cdx_page(r):
+    rows = []
+    resume_key = None
+
+    lines = r.iter_lines(decode_unicode=True)
+    for line in lines:
+        if not line:
+            # blank line separates rows from resume key
+            resume_key = next(lines, None)
+            break
+        rows.append(line.split(" ", 1)[0])
+
+    return rows, resume_key
+
+
+def iter_cdx_pages(params, page_size=CDX_PAGE_SIZE, retry_policy=None, rate_limiter=None):
+    """
+    Yields CDX index rows page by page (list of timestamps per page), following resumeKey.
+    Rows are read from the streamed plain text response, no full json document is built.
+    :param rate_limiter: shared with the snapshot downloads, so index pages count against the same rate
+    """
+    params = dict(params, limit=page_size, showResumeKey="true")
+
+    while True:
+        rows, resume_key = request_with_retry(CDX_URL, read_cdx_page, params=params, rate_limiter=rate_limiter,
+                                              retry_policy=retry_policy)
+
+        yield rows
+
+        if not resume_key:
+            return
+        params = dict(params, resumeKey=resume_key)
+
+
+def fetch_snapshot_index(url, cache_dir=None, page_size=CDX_PAGE_SIZE,
+                         start_date=None, end_date=None, collapse=None, retry_policy=None, rate_limiter=None):
+    """
+    Capture timestamps (yyyymmddhhmmss strings) of url, if cache_dir is set only captures
+    newer than the last cached one are requested.
+    Date range and collapse are applied by the CDX server, collapse=N keeps only the first capture
+    for each distinct N digit timestamp prefix (e.g. 10 -> one per hour).
+    Index of each server (CDX_URL) is cached separately.
+    """
     params = {
         "url": url,
-        "output": "json",
         "fl": "timestamp",
         "filter": "statuscode:200"
     }
+    if start_date:
+        params["from"] = start_date.strftime("%Y%m%d")
+    if end_date:
+        params["to"] = end_date.strftime("%Y%m%d") + "235959"
+    if collapse:
+        params["collapse"] = f"timestamp:{collapse}"
+
+    cache = IndexCache(cache_dir, url, params, cdx_url=CDX_URL) if cache_dir else None
+    timestamps = cache.load() if cache else []
+    last_cached = cache.last_timestamp if cache else None
+
+    if last_cached:
+        logging.info(f"{len(timestamps)} snapshots cached, fetching captures since {last_cached}")
+        params["from"] = last_cached
+
+    for page in iter_cdx_pages(params, page_size, retry_policy, rate_limiter):
+        if last_cached:
+            page = [ts for ts in page if ts > last_cached]
+        timestamps.extend(page)
+        if cache:
+            cache.append(page)
+        logging.debug(f"Fetched {len(page)} index rows")
 
-    r = requests.get(CDX_URL, params=params)
-    r.raise_for_status()
+    return timestamps
 
-    data = r.json()[1:]
 
-    timestamps = []
-    for row in data:
-        ts = row[0]
-        timestamps.append(dt.datetime.strptime(ts, "%Y%m%d%H%M%S"))
-
-    return timestamps
+def fetch_snapshots(url, cache_dir=None, start_date=None, end_date=None, collapse=None):
+    timestamps = fetch_snapshot_index(url, cache_dir, start_date=start_date, end_date=end_date, collapse=collapse)
+    return [dt.datetime.strptime(ts, TIMESTAMP_FORMAT) for ts in timestamps]
 
 
 def filter_date_range(timestamps, start_date, end_date):
@@ -118,26 +255,169 @@ def choose_closest(group, time_of_day):
     return best
 
 
-def download_snapshot(ts, url, output_dir, file_string):
+def download_snapshot(ts, url, output_dir, file_string, rate_limiter=None, retry_policy=None, store=None,
+                      compress=None):
+    """
+    :param rate_limiter: defaults to the shared default_rate_limiter() (one request start per REQUEST_DELAY)
+    """
+    path = snapshot_path(ts, output_dir, file_string)
+
+    stored = request_with_retry(snapshot_url(ts, url),
+                                lambda r: storage.stream_to_file(r, path, store=store, compress=compress),
+                                rate_limiter=rate_limiter or default_rate_limiter(), retry_policy=retry_policy)
+
+    logging.debug(f"Saved {stored.path} ({stored.size} bytes, sha256 {stored.sha256})")
+    return stored
 
-    ts_str = ts.strftime("%Y%m%d%H%M%S")
-    formatted = ts.strftime("%Y-%m-%d-%H-%M-%S")
 
-    archive_url = ARCHIVE_URL.format(timestamp=ts_str, url=url)
+def stage_snapshot(ts, url, output_dir, file_string, rate_limiter=None, retry_policy=None, store=None,
+                   compress=None):
+    """
+    As download_snapshot, but the body is only streamed into a temp file (storage.StagedFile),
+    storage.finish_staged() moves it into place.
+    """
+    path = snapshot_path(ts, output_dir, file_string)
 
+    return request_with_retry(snapshot_url(ts, url),
+                              lambda r: storage.stage_chunks(r.iter_content(chunk_size=storage.CHUNK_SIZE), path,
+                                                             store=store, compress=compress),
+                              rate_limiter=rate_limiter or default_rate_limiter(), retry_policy=retry_policy)
+
+
+def snapshot_url(ts, url):
+    archive_url = ARCHIVE_URL.format(timestamp=ts.strftime(TIMESTAMP_FORMAT), url=url)
     logging.info(f"Downloading {archive_url}")
+    return archive_url
+
+
+def snapshot_path(ts, output_dir, file_string):
+    return os.path.join(output_dir, f"{ts.strftime('%Y-%m-%d-%H-%M-%S')}_{file_string}")
+
+
+def default_rate_limiter():
+    """
+    Limiter shared by downloads not given one: request starts are at least REQUEST_DELAY apart
+    (time spent in the previous request counts, unlike a fixed sleep before each one).
+    """
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter(1 / REQUEST_DELAY)
+        return _default_limiter
+
+
+def download_and_record(ts, url, output_dir, file_string, rate_limiter, manifest=None, retry_policy=None,
+                        store=None, compress=None):
+    """
+    Returns False instead of raising if download failed, so other snapshots are still downloaded.
+    """
+    ts_str = ts.strftime(TIMESTAMP_FORMAT)
+    try:
+        stored = download_snapshot(ts, url, output_dir, file_string, rate_limiter,
+                                   retry_policy=retry_policy, store=store, compress=compress)
+    except OSError as e:  # includes requests.RequestException
+        return record_failure(ts_str, e, manifest)
+    return record_download(ts_str, stored, manifest)
+
+
+def download_write_behind(ts, url, output_dir, file_string, rate_limiter, writer, manifest=None, retry_policy=None,
+                          store=None, compress=None):
+    """
+    As download_and_record, but only the body is streamed to a temp file here, moving it into place
+    (or into the store) and updating the manifest is left to writer (storage.BackgroundWriter)
+    while the next snapshot is downloaded. Returns a Future of the result.
+    """
+    ts_str = ts.strftime(TIMESTAMP_FORMAT)
+    try:
+        staged = stage_snapshot(ts, url, output_dir, file_string, rate_limiter, retry_policy=retry_policy,
+                                store=store, compress=compress)
+    except OSError as e:
+        return writer.submit(record_failure, ts_str, e, manifest)
+
+    def finish():
+        try:
+            stored = storage.finish_staged(staged, store=store)
+        except OSError as e:
+            return record_failure(ts_str, e, manifest)
+        logging.debug(f"Saved {stored.path} ({stored.size} bytes, sha256 {stored.sha256})")
+        return record_download(ts_str, stored, manifest)
+
+    return writer.submit(finish)
+
+
+def record_download(ts_str, stored, manifest=None):
+    if manifest is not None:
+        manifest.record(ts_str, DONE, file=os.path.basename(stored.path), size=stored.size, sha256=stored.sha256,
+                        file_size=os.path.getsize(stored.path), archive=ARCHIVE_BASE)
+    return True
+
+
+def record_failure(ts_str, error, manifest=None):
+    logging.error(f"Failed to download snapshot {ts_str}: {error}")
+    if manifest is not None:
+        manifest.record(ts_str, FAILED, error=str(error))
+    return False
+
+
+def download_all(selected, url, output_dir, file_string, workers=1, rate=None, manifest=None,
+                 max_rate=None, retry_policy=None, store=None, compress=None, rate_limiter=None):
+    """
+    workers=1: snapshots are downloaded one by one, each file is moved into place while the next one is downloaded.
+    :param rate_limiter: limiter already used for other requests (e.g. the index), else one is made from
+    rate and max_rate
+    """
+    if manifest is not None:
+        manifest.add_pending(ts.strftime(TIMESTAMP_FORMAT) for ts in selected)
+        remaining = [ts for ts in selected
+                     if not manifest.is_complete(ts.strftime(TIMESTAMP_FORMAT), archive=ARCHIVE_BASE)]
+        if len(remaining) < len(selected):
+            logging.info(f"Skipping {len(selected) - len(remaining)} snapshots already downloaded")
+        selected = remaining
+
+    rate_limiter = rate_limiter or RateLimiter(rate or 1 / REQUEST_DELAY, max_rate=max_rate)
+    if workers > session.get_session().pool_size:
+        session.configure_session(pool_size=workers)
+
+    if workers <= 1:
+        with storage.BackgroundWriter() as writer:
+            futures = [download_write_behind(ts, url, output_dir, file_string, rate_limiter, writer, manifest,
+                                             retry_policy, store, compress)
+                       for ts in selected]
+        results = [future.result() for future in futures]
+    else:
+        logging.info(f"Downloading {len(selected)} snapshots with {workers} workers")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(download_and_record, ts, url, output_dir, file_string,
+                                       rate_limiter, manifest, retry_policy, store, compress)
+                       for ts in selected]
+            results = [future.result() for future in futures]
+
+    failed = results.count(False)
+    if failed:
+        raise RuntimeError(f"{failed} of {len(selected)} snapshots failed to download, rerun to retry them")
+
+
+def log_selection(epochs, chosen):
 
-    logging.warning("Rate limiting requests")
-    time.sleep(REQUEST_DELAY)
+    chosen_days = {e // snapshotselect.SECONDS_PER_DAY: e for e in chosen}
+    groups = defaultdict(list)
+
+    for e in epochs:
+        day = e // snapshotselect.SECONDS_PER_DAY
+        if day in chosen_days:
+            groups[day].append(e)
 
-    r = requests.get(archive_url)
-    r.raise_for_status()
+    for day, group in sorted(groups.items()):
 
-    filename = f"{formatted}_{file_string}"
-    path = os.path.join(output_dir, filename)
+        logging.info(f"Group {snapshotselect.to_datetime(day * snapshotselect.SECONDS_PER_DAY).date()}")
+
+        for e in group:
+            if e == chosen_days[day]:
+                logging.info(f"Selected {snapshotselect.to_datetime(e)}")
+            else:
+                logging.info(f"Discarded {snapshotselect.to_datetime(e)}")
 
-    with open(path, "wb") as f:
-        f.write(r.content)
 
 def fetch_from_archive(args):
 
@@ -156,32 +436,32 @@ def fetch_from_archive(args):
 
     logging.info("Fetching snapshot list")
 
-    timestamps = fetch_snapshots(args.url)
-
-    timestamps = filter_date_range(timestamps, start_date, end_date)
+    if args.archive_base:
+        configure_archive(args.archive_base)
+    retry_policy = RetryPolicy(max_retries=args.retries)
+    rate_limiter = RateLimiter(args.rate or 1 / REQUEST_DELAY, max_rate=args.max_rate)
 
-    groups = group_snapshots(timestamps, args)
+    cache_dir = args.cache_dir or os.path.join(args.output_dir, INDEX_CACHE_DIR)
+    index = fetch_snapshot_index(args.url, cache_dir=cache_dir, start_date=start_date, end_date=end_date,
+                                 collapse=args.collapse, retry_policy=retry_policy, rate_limiter=rate_limiter)
 
-    selected = []
+    epochs = snapshotselect.parse_timestamps(index)
 
-    for key, group in sorted(groups.items()):
+    epochs = snapshotselect.filter_range(epochs, start_date, end_date)
 
-        chosen = choose_closest(group, args.time_of_day)
+    chosen = snapshotselect.select(epochs, args.day_of_week, args.day_of_month, args.time_of_day)
 
-        if args.verbose:
+    selected = [snapshotselect.to_datetime(e) for e in chosen]
 
-            logging.info(f"Group {key}")
-
-            for ts in group:
-                if ts == chosen:
-                    logging.info(f"Selected {ts}")
-                else:
-                    logging.info(f"Discarded {ts}")
-
-        selected.append(chosen)
+    if args.verbose:
+        log_selection(epochs, chosen)
 
     if not selected:
         logging.warning("No snapshots matched selection criteria")
 
-    for ts in selected:
-        download_snapshot(ts, args.url, args.output_dir, file_string)
+    manifest = Manifest(os.path.join(args.output_dir, MANIFEST_NAME))
+    store = storage.BlobStore(args.store, compress=args.compress) if args.store else None
+
+    download_all(selected, args.url, args.output_dir, file_string,
+                 workers=args.workers, manifest=manifest, retry_policy=retry_policy, store=store,
+                 compress=args.compress, rate_limiter=rate_limiter)
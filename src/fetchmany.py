@@ -0,0 +1,90 @@
+"""
+Download many urls in one run: asyncio schedules the downloads (global and per host limits),
+blocking FetchSite downloads run on a thread pool sharing the pooled session
+"""
+import logging
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from src import session
+from src.fetchsite import FetchSite
+from src.httpcache import MetadataStore
+from src.storage import BlobStore
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_PER_HOST = 4
+
+
+def read_urls(source: str) -> List[str]:
+    """
+    :param source: file with one url per line, "-" for stdin. Empty lines and lines starting with # are skipped.
+    """
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source) as file:
+            lines = file.read().splitlines()
+    urls = [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+    return list(dict.fromkeys(urls))
+
+
+def fetch_many(urls: List[str], add_timestamp: bool = True, output_dir: str = None, stream: bool = False,
+               cache: Optional[MetadataStore] = None, link_unchanged: Optional[str] = None,
+               store: Optional[BlobStore] = None, compress: Optional[str] = None, keep_encoding: bool = False,
+               concurrency: int = DEFAULT_CONCURRENCY,
+               per_host: int = DEFAULT_PER_HOST) -> Dict[str, object]:
+    """
+    Returns url -> saved path (None if unchanged and not linked) or the exception the download failed with.
+    """
+    import asyncio  # not needed (nor its import time) for single url runs of fetch.py
+
+    if concurrency < 1 or per_host < 1:
+        raise ValueError("concurrency and per_host must be at least 1")
+    _warn_duplicate_names(urls)
+    if concurrency > session.get_session().pool_size:
+        session.configure_session(pool_size=concurrency)
+
+    options = {"add_timestamp": add_timestamp, "output_dir": output_dir, "stream": stream,
+               "cache": cache, "link_unchanged": link_unchanged, "store": store,
+               "compress": compress, "keep_encoding": keep_encoding}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return asyncio.run(_fetch_all(urls, executor, concurrency, per_host, options))
+
+
+async def _fetch_all(urls, executor, concurrency, per_host, options) -> Dict[str, object]:
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    total_limit = asyncio.Semaphore(concurrency)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+    async def fetch_one(url):
+        async with host_limits[urlsplit(url).netloc], total_limit:
+            return await loop.run_in_executor(executor, lambda: fetch_url(url, **options))
+
+    results = await asyncio.gather(*(fetch_one(url) for url in urls), return_exceptions=True)
+    return dict(zip(urls, results))
+
+
+def fetch_url(url: str, add_timestamp: bool = True, file_name: str = None, output_dir: str = None,
+              stream: bool = False, cache: Optional[MetadataStore] = None, link_unchanged: Optional[str] = None,
+              store: Optional[BlobStore] = None, compress: Optional[str] = None, keep_encoding: bool = False):
+    site = FetchSite(url, cache=cache, store=store, compress=compress, keep_encoding=keep_encoding)
+    if stream or keep_encoding:
+        path = site.stream_to_file(add_timestamp=add_timestamp, file_name=file_name, output_dir=output_dir,
+                                   link_unchanged=link_unchanged)
+    else:
+        path = site.download_content().to_file(add_timestamp=add_timestamp, file_name=file_name,
+                                               output_dir=output_dir, link_unchanged=link_unchanged)
+    logging.info(f"Fetched {url}")
+    return path
+
+
+def _warn_duplicate_names(urls: List[str]) -> None:
+    names = Counter(url.rsplit('/', 1)[-1] for url in urls)
+    for name, count in names.items():
+        if count > 1:
+            logging.warning(f"{count} urls are saved under the same name '{name}' and may overwrite each other")
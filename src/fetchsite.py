@@ -2,30 +2,159 @@
 Download website content from url and save to file
 """
 import datetime
-import requests
+import hashlib
+import logging
+import os
+import time
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
+
+from src import compression, metrics, session, storage
+from src.httpcache import MetadataStore
+from src.storage import BlobStore, link_file
 
 
 class FetchSite:
-    def __init__(self, url: str) -> None:
+    def __init__(self, url: str, cache: Optional[MetadataStore] = None, store: Optional[BlobStore] = None,
+                 compress: Optional[str] = None, keep_encoding: bool = False) -> None:
+        """
+        :param cache: if set, requests are conditional (ETag/Last-Modified) and unchanged content is not
+                      written again. Store is updated in memory, caller is responsible for cache.save()
+        :param store: if set, content is saved once per distinct content into the store and
+                      saved files are links to it
+        :param compress: codec name, files are saved compressed with the codec suffix (with store: store decides)
+        :param keep_encoding: stream_to_file asks for gzip/zstd and saves the body as sent, without decoding it
+                              (not with store)
+        """
         self.url = url
+        self.cache = cache
+        self.store = store
+        self.compress = compress
+        self.keep_encoding = keep_encoding
         self.content = None
         self.content_time = None
+        self.size = None
+        self.sha256 = None
+        self.status_code = None
+        self.not_modified = False
+        self.etag = None
+        self.last_modified = None
 
     def download_content(self):
         self._timestamp_content()
-        response = requests.get(self.url)
-        self.content = response.content
+        start = time.perf_counter()
+        response = session.get_session().get(self.url, headers=self._conditional_headers())
+        metrics.record_request(response, start)
+        response.raise_for_status()  # error page is not saved as the content
+        self._read_validators(response)
+        if not self.not_modified:
+            self.content = response.content
+            if self.cache:
+                self.sha256 = hashlib.sha256(self.content).hexdigest()
         return self
 
-    def to_file(self, add_timestamp: bool = True, file_name: str = None, output_dir: str = None) -> None:
+    def to_file(self, add_timestamp: bool = True, file_name: str = None, output_dir: str = None,
+                link_unchanged: Optional[str] = None) -> Optional[Path]:
+        """
+        :param link_unchanged: None -> unchanged content is not saved again,
+                               "hard"/"symlink" -> unchanged content is linked to previously saved file
+        """
+        output_full_path = self._format_full_path(add_timestamp=add_timestamp,
+                                                  file_name=file_name,
+                                                  output_dir=output_dir)
+        if self._unchanged(output_full_path):
+            return self._reuse_previous(output_full_path, link_unchanged)
+
+        if self.store:
+            output_full_path = self.store.add_bytes(self.content, output_full_path).path
+        elif self.compress:
+            output_full_path = storage.write_chunks([self.content], output_full_path, compress=self.compress,
+                                                    size=len(self.content)).path
+        else:
+            with open(output_full_path, "wb") as file:
+                file.write(self.content)
+        self._update_cache(output_full_path)
+        return output_full_path
+
+    def stream_to_file(self, add_timestamp: bool = True, file_name: str = None, output_dir: str = None,
+                       chunk_size: int = storage.CHUNK_SIZE, link_unchanged: Optional[str] = None) -> Optional[Path]:
+        """
+        Downloads and writes content chunk by chunk (content is not kept in memory).
+        """
+        self._timestamp_content()
         output_full_path = self._format_full_path(add_timestamp=add_timestamp,
                                                   file_name=file_name,
                                                   output_dir=output_dir)
 
-        with open(output_full_path, "wb") as file:
-            file.write(self.content)
+        saved_path = output_full_path
+        keep_encoding = self.keep_encoding and not self.store
+        headers = self._conditional_headers()
+        if keep_encoding:
+            headers["Accept-Encoding"] = ", ".join(compression.saved_encodings())
+        start = time.perf_counter()
+        with session.get_session().get(self.url, stream=True, headers=headers) as response:
+            if not response.ok:
+                metrics.record_request(response, start)
+                response.raise_for_status()
+            self._read_validators(response)
+            if not self.not_modified:
+                if keep_encoding:
+                    stored = storage.stream_encoded_to_file(response, output_full_path, chunk_size=chunk_size,
+                                                            compress=self.compress)
+                else:
+                    stored = storage.stream_to_file(response, output_full_path, chunk_size=chunk_size,
+                                                    store=self.store, compress=self.compress)
+                saved_path = stored.path
+                self.size = stored.size
+                self.sha256 = stored.sha256
+            metrics.record_request(response, start)
+
+        if self._unchanged(saved_path):
+            if not self.not_modified:
+                os.unlink(saved_path)
+            return self._reuse_previous(output_full_path, link_unchanged)
+        self._update_cache(saved_path)
+        return saved_path
+
+    def _conditional_headers(self) -> dict:
+        if self.cache and self.cache.previous_file(self.url):
+            return self.cache.conditional_headers(self.url)
+        return {}
+
+    def _read_validators(self, response) -> None:
+        self.status_code = response.status_code
+        self.not_modified = response.status_code == 304
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+
+    def _unchanged(self, output_full_path: Path) -> bool:
+        if self.not_modified:
+            return True
+        if not self.cache or self.sha256 is None:
+            return False
+        previous = self.cache.previous_file(self.url)
+        return previous is not None \
+            and Path(previous).resolve() != Path(output_full_path).resolve() \
+            and self.cache.get(self.url).get("sha256") == self.sha256
+
+    def _reuse_previous(self, output_full_path: Path, link_unchanged: Optional[str]) -> Optional[Path]:
+        previous = self.cache.previous_file(self.url)
+        self._update_cache(previous)
+        if link_unchanged:
+            # link keeps the suffix of the file it points to
+            codec = compression.detect(previous)
+            output_full_path = compression.compressed_path(output_full_path, codec.name if codec else None)
+            link_file(previous, output_full_path, how=link_unchanged)
+            logging.info(f"{self.url} unchanged, linked {output_full_path} to {previous}")
+            return output_full_path
+        logging.info(f"{self.url} unchanged since {previous}, not saved again")
+        return None
+
+    def _update_cache(self, saved_path: Path) -> None:
+        # only a page received in full (2xx) or revalidated (304) replaces the cached entry
+        if self.cache and (self.not_modified or 200 <= self.status_code < 300):
+            self.cache.update(self.url, etag=self.etag, last_modified=self.last_modified,
+                              sha256=self.sha256, path=os.path.abspath(saved_path))
 
     def _format_filename(self, add_timestamp: bool = True, file_name: Union[str, None] = None) -> str:
         if file_name:
@@ -1,42 +1,173 @@
 """
 Run checks on file output (website content) from fetch module
 """
-import requests
+import hashlib
+import mmap
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from pathlib import Path
 
-from src import validatehtml
+from src import compression, metrics, validatehtml
+
+
+class ContentBuffer:
+    def __init__(self, file_path):
+        """
+        Checked file shared by all checks: content is loaded at most once (on first use)
+        and derived values (size, sha256, html check result) are computed once.
+        """
+        self.file_path = Path(file_path)
+        self.lock = threading.RLock()
+        self._file = None
+        self._content = None
+        self._size = None
+        self._sha256 = None
+        self._html_errors = {}
+        self._html_locks = {}  # one per full_check value, the scan does not hold self.lock
+
+    def size(self) -> int:
+        """
+        Uncompressed content size from os.stat (or compressed file header), file is not read.
+        """
+        with self.lock:
+            if self._size is None:
+                self._size = compression.content_size(self.file_path)
+            return self._size
+
+    def content(self):
+        """
+        Plain file -> read-only mmap (not copied into memory), compressed file -> decompressed bytes.
+        """
+        with self.lock:
+            if self._content is None:
+                if compression.detect(self.file_path):
+                    with compression.open_read(self.file_path) as file:
+                        self._content = file.read()
+                else:
+                    self._file = open(self.file_path, "rb")
+                    self._content = _map_file(self._file)
+            return self._content
+
+    def sha256(self) -> str:
+        with self.lock:
+            if self._sha256 is None:
+                self._sha256 = hashlib.sha256(self.content()).hexdigest()
+            return self._sha256
+
+    def html_errors(self, full_check: bool = True):
+        """
+        Scanned once per full_check value, other checks (size, content) are not blocked meanwhile.
+        """
+        with self.lock:
+            scan_lock = self._html_locks.setdefault(full_check, threading.Lock())
+        with scan_lock:
+            if full_check not in self._html_errors:
+                self._html_errors[full_check] = self._check_html(full_check)
+            return self._html_errors[full_check]
+
+    def close(self) -> None:
+        with self.lock:
+            if isinstance(self._content, mmap.mmap):
+                self._content.close()
+            if self._file:
+                self._file.close()
+            self._file = None
+            self._content = None
+
+    def _check_html(self, full_check: bool):
+        start = time.perf_counter()
+        errors = self._scan_html(full_check)
+        metrics.record_scan(self.size(), time.perf_counter() - start, full_check)
+        return errors
+
+    def _scan_html(self, full_check: bool):
+        checker = validatehtml.ChkHtmlStructure(full_check=full_check)
+        with self.lock:
+            loaded = self._content is not None
+        if not loaded and compression.detect(self.file_path):
+            # compressed and not loaded yet -> fed to the checker chunk by chunk, never held in memory whole
+            with compression.open_read(self.file_path) as file:
+                for chunk in iter(lambda: file.read(compression.READ_SIZE), b""):
+                    checker.feed(chunk)
+                    if checker.stopped:
+                        break
+            return checker.close()
+        return checker.run_checks(self.content())
 
 
 class FileCheck:
-    def __init__(self, checked_file: str, check_type: dict, tolerance: float = 0.05):
+    def __init__(self, checked_file: str, check_type: dict, tolerance: float = 0.05, fast_size: bool = False,
+                 parallel: bool = True, fail_fast: bool = False):
+        """
+        :param fast_size: against_site only asks for the size of the page (HEAD / ranged GET),
+                          the page is not downloaded unless the server does not tell its size
+        :param parallel: checks run at the same time (e.g. html check while the site is downloaded)
+        :param fail_fast: only pass/fail matters -> checks run one by one and stop at the first issue,
+                          html check stops scanning at the first error (reported with its line/offset)
+        """
         self.checked_file = checked_file
         self.check_type = check_type
         self.tolerance = tolerance
-        self.check_file_content = None
+        self.fast_size = fast_size
+        self.parallel = parallel
+        self.fail_fast = fail_fast
+        self.size_lock = threading.Lock()  # size checks share check_file_size / check_against_size
+        self.content = ContentBuffer(checked_file)
+        self.check_file_size = None
+        self.check_against_size = None
         self.check_against_content = None
         self.check_map = {"html_structure": self.check_html,
                           "against_site": self.check_against_site,
                           "against_file": self.check_against_file}
 
     def run_checks(self):
-        issues = []
-        for check, param in self.check_type.items():
-            flagged = self.check_map[check](param)
-            if flagged:
-                issues.append(flagged)
+        """
+        Issues are collected in check_type order, also when checks run in parallel.
+        """
+        try:
+            if self.fail_fast:
+                results = []
+                for check, param in self.check_type.items():
+                    results.append(self._run_check(check, param))
+                    if results[-1]:
+                        break
+            elif self.parallel and len(self.check_type) > 1:
+                with ThreadPoolExecutor(max_workers=len(self.check_type)) as executor:
+                    futures = [executor.submit(self._run_check, check, param)
+                               for check, param in self.check_type.items()]
+                    results = [future.result() for future in futures]
+            else:
+                results = [self._run_check(check, param) for check, param in self.check_type.items()]
+        finally:
+            self.content.close()
+        issues = [flagged for flagged in results if flagged]
         if issues:
             raise Exception(issues)
 
+    def _run_check(self, check: str, param):
+        start = time.perf_counter()
+        issue = self.check_map[check](param)
+        seconds = time.perf_counter() - start
+        recorder = metrics.get_metrics()
+        recorder.observe("check_seconds", seconds, check=check)
+        recorder.event("check", file=str(self.checked_file), check=check, seconds=round(seconds, 6), passed=not issue)
+        return issue
+
     def check_against_file(self, check_against: str) -> Optional[str]:
-        self._load_contents(check_against, against_file=True)
-        ratio = self.check_size()
+        with self.size_lock:
+            self._load_contents(check_against, against_file=True)
+            ratio = self.check_size()
         if ratio:
             return self._format_size_diff_msg(check_against, ratio)
 
     def check_against_site(self, check_against: str) -> Optional[str]:
-        self._load_contents(check_against, against_file=False)
-        ratio = self.check_size()
+        with self.size_lock:
+            self._load_contents(check_against, against_file=False)
+            ratio = self.check_size()
         if ratio:
             return self._format_size_diff_msg(check_against, ratio)
 
@@ -46,14 +177,11 @@ class FileCheck:
         return msg
 
     def check_html(self, full_check: bool = True) -> str:
-        self.check_file_content = self._load_from_file(self.checked_file)
-        errors = validatehtml.ChkHtmlStructure(full_check=full_check).run_checks(self.check_file_content)
-        return errors
+        return self.content.html_errors(full_check and not self.fail_fast)
 
     def check_size(self):
-        difference = self._get_size(self.check_file_content) \
-                     - self._get_size(self.check_against_content)
-        ratio = abs(difference) / self._get_size(self.check_file_content)
+        difference = self.check_file_size - self.check_against_size
+        ratio = abs(difference) / self.check_file_size
         if ratio > self.tolerance:
             return ratio
 
@@ -64,22 +192,78 @@ class FileCheck:
         raise NotImplemented
 
     def _load_contents(self, check_against: str, against_file: bool = True):
-        self.check_file_content = self._load_from_file(self.checked_file)
+        """
+        Sizes to compare, files are not read (uncompressed size of compressed files comes from their header).
+        """
+        self.check_file_size = self.content.size()
         if against_file:
-            self.check_against_content = self._load_from_file(check_against)
+            self.check_against_size = self._get_file_size(check_against)
+        elif self.fast_size:
+            self.check_against_size = self._get_remote_size(check_against)
         else:
             self.check_against_content = self._load_from_url(check_against)
+            self.check_against_size = self._get_size(self.check_against_content)
 
-    def _load_from_file(self, file_path) -> str:
-        file_path = Path(file_path)
-        with open(file_path) as file:
-            data = file.read()
-        return data
+    def _get_file_size(self, file_path) -> int:
+        return compression.content_size(Path(file_path))
 
     def _load_from_url(self, url: str) -> str:
-        response = requests.get(url)
+        from src import session  # requests is only imported by checks against a site
+
+        start = time.perf_counter()
+        response = session.get_session().get(url)
         content = response.content
+        metrics.record_request(response, start)
         return content
 
     def _get_size(self, content: str) -> int:
         return len(content)
+
+    def _get_remote_size(self, url: str) -> int:
+        """
+        Uncompressed size of the page at url: Content-Length of a HEAD request, else the total
+        of a one byte ranged GET (Content-Range), else the streamed body is counted (never buffered):
+        the ranged GET's own body if the server ignored Range, else the body of a plain GET.
+        """
+        from src import session
+
+        http = session.get_session()
+        identity = {"Accept-Encoding": "identity"}  # Content-Length of the uncompressed page
+
+        start = time.perf_counter()
+        response = http.head(url, headers=identity, allow_redirects=True)
+        metrics.record_request(response, start, method="HEAD")
+        if response.ok and _not_encoded(response) and response.headers.get("Content-Length"):
+            return int(response.headers["Content-Length"])
+
+        start = time.perf_counter()
+        with http.get(url, headers={**identity, "Range": "bytes=0-0"}, stream=True) as response:
+            if response.status_code == 200:  # Range ignored, the whole body is sent anyway
+                size = sum(len(chunk) for chunk in response.iter_content(chunk_size=compression.READ_SIZE))
+                metrics.record_request(response, start, method="GET", range="bytes=0-0")
+                return size
+            match = re.match(r"bytes \d+-\d+/(\d+)", response.headers.get("Content-Range", ""))
+            metrics.record_request(response, start, method="GET", range="bytes=0-0")
+            if response.status_code == 206 and _not_encoded(response) and match:
+                return int(match.group(1))
+
+        start = time.perf_counter()
+        with http.get(url, stream=True) as response:
+            response.raise_for_status()
+            size = sum(len(chunk) for chunk in response.iter_content(chunk_size=compression.READ_SIZE))
+            metrics.record_request(response, start, method="GET")
+            return size
+
+
+def _map_file(file):
+    """
+    File content as read-only bytes buffer (mmap), without decoding or copying it into memory.
+    Empty file cannot be mapped -> b"".
+    """
+    if os.fstat(file.fileno()).st_size == 0:
+        return b""
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _not_encoded(response) -> bool:
+    return response.headers.get("Content-Encoding", "identity").lower() == "identity"
@@ -0,0 +1,54 @@
+"""
+On-disk metadata (ETag, Last-Modified, content hash, last saved file) per url for conditional GET
+"""
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+
+class MetadataStore:
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.entries = {}
+        self.lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path) as file:
+                self.entries = json.load(file)
+
+    def get(self, url: str) -> dict:
+        with self.lock:
+            return dict(self.entries.get(url, {}))
+
+    def conditional_headers(self, url: str) -> dict:
+        entry = self.get(url)
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def previous_file(self, url: str) -> Optional[Path]:
+        """
+        Last saved file for url, if it is still on disk.
+        """
+        saved = self.get(url).get("path")
+        if saved and Path(saved).exists():
+            return Path(saved)
+
+    def update(self, url: str, **values) -> None:
+        with self.lock:
+            entry = self.entries.setdefault(url, {})
+            entry.update({key: str(value) for key, value in values.items() if value is not None})
+
+    def save(self) -> None:
+        with self.lock:
+            data = json.dumps(self.entries, indent=2, sort_keys=True)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".part")
+        with os.fdopen(fd, "w") as file:
+            file.write(data)
+        os.replace(tmp_path, self.path)
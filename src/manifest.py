@@ -0,0 +1,89 @@
+"""
+Local manifest (json lines) of archive snapshots selected for download, so an interrupted backfill can be resumed
+"""
+import datetime as dt
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+MANIFEST_NAME = ".manifest.jsonl"
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class Manifest:
+    def __init__(self, path: Union[str, Path]):
+        """
+        Every status change is appended as one line, last line of a timestamp wins.
+        """
+        self.path = Path(path)
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.needs_newline = False
+        if self.path.exists():
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path) as file:
+            for line in file:
+                self.needs_newline = not line.endswith("\n")
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # line cut short by a crash, status of that snapshot is unknown -> redownload
+                    logging.warning(f"Skipping malformed manifest line in {self.path}")
+                    continue
+                self.entries[entry["timestamp"]] = entry
+
+    def status(self, timestamp: str) -> str:
+        return self.entries.get(timestamp, {}).get("status")
+
+    def is_complete(self, timestamp: str, archive: Optional[str] = None) -> bool:
+        """
+        Done according to manifest and file is still on disk with recorded size
+        (file_size differs from content size if file is compressed).
+        :param archive: server the snapshot should come from, one downloaded from another server is not complete
+                        (entries recorded without archive are accepted)
+        """
+        entry = self.entries.get(timestamp)
+        if not entry or entry["status"] != DONE:
+            return False
+        if archive is not None and entry.get("archive", archive) != archive:
+            return False
+        file_path = self.path.parent / entry["file"]
+        return file_path.exists() and file_path.stat().st_size == entry.get("file_size", entry["size"])
+
+    def add_pending(self, timestamps) -> None:
+        """
+        Records newly selected timestamps (ones already in the manifest keep their status).
+        """
+        self._append([self._entry(ts, PENDING) for ts in timestamps if ts not in self.entries])
+
+    def record(self, timestamp: str, status: str, **values) -> None:
+        self._append([self._entry(timestamp, status, **values)])
+
+    def _entry(self, timestamp: str, status: str, **values) -> dict:
+        entry = {"timestamp": timestamp, "status": status,
+                 "updated": dt.datetime.now().isoformat(timespec="seconds")}
+        entry.update({key: value for key, value in values.items() if value is not None})
+        return entry
+
+    def _append(self, entries) -> None:
+        if not entries:
+            return
+        lines = "".join(json.dumps(entry) + "\n" for entry in entries)
+        with self.lock:
+            if self.needs_newline:
+                lines = "\n" + lines
+                self.needs_newline = False
+            for entry in entries:
+                self.entries[entry["timestamp"]] = entry
+            with open(self.path, "a") as file:
+                file.write(lines)
+                file.flush()
+                os.fsync(file.fileno())
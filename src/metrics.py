@@ -0,0 +1,203 @@
+"""
+Timing and size metrics of requests and checks.
+Aggregates (count / sum / max per metric and labels) are exported in Prometheus text format,
+single events (one per request attempt / check) can be written as JSON lines while running.
+"""
+import datetime as dt
+import json
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+PREFIX = "webfetcher_"
+FORMATS = ["jsonl", "prometheus"]
+MB = 1024 * 1024
+
+_metrics = None
+_metrics_lock = threading.Lock()
+_local = threading.local()  # connect time of the request made by this thread
+
+
+class Metrics:
+    def __init__(self, events_path: Optional[str] = None):
+        """
+        :param events_path: if set, every event is appended to it as a JSON line
+        """
+        self.events_path = events_path
+        self.summaries = {}  # (name, labels) -> [count, sum, max]
+        self.counters = {}  # (name, labels) -> total
+        self.lock = threading.Lock()
+        self.events = open(events_path, "a", encoding="utf-8") if events_path else None
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            summary = self.summaries.setdefault(key, [0, 0.0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def event(self, kind: str, **fields) -> None:
+        if self.events is None:
+            return
+        line = json.dumps({"event": kind, "time": dt.datetime.now().isoformat(timespec="milliseconds"), **fields})
+        with self.lock:
+            self.events.write(line + "\n")
+            self.events.flush()
+
+    def drain(self) -> dict:
+        """
+        Aggregates collected so far (picklable, for merge() in another process), collection starts over.
+        """
+        with self.lock:
+            samples = {"summaries": self.summaries, "counters": self.counters}
+            self.summaries, self.counters = {}, {}
+            return samples
+
+    def merge(self, samples: dict) -> None:
+        with self.lock:
+            for key, (count, total, maximum) in samples["summaries"].items():
+                summary = self.summaries.setdefault(key, [0, 0.0, 0.0])
+                summary[0] += count
+                summary[1] += total
+                summary[2] = max(summary[2], maximum)
+            for key, value in samples["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def prometheus(self) -> str:
+        """
+        Aggregates in Prometheus text exposition format (summaries without quantiles, plus a _max gauge).
+        """
+        lines = []
+        with self.lock:
+            for name in sorted({name for name, _ in self.summaries}):
+                series = sorted((labels, summary) for (key, labels), summary in self.summaries.items()
+                                if key == name)
+                lines.append(f"# TYPE {PREFIX}{name} summary")
+                for labels, (count, total, _) in series:
+                    lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {count}")
+                    lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {total:g}")
+                lines.append(f"# TYPE {PREFIX}{name}_max gauge")
+                for labels, (_, _, maximum) in series:
+                    lines.append(f"{PREFIX}{name}_max{_format_labels(labels)} {maximum:g}")
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for (key, labels), value in sorted(self.counters.items()):
+                    if key == name:
+                        lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value:g}")
+        return "".join(line + "\n" for line in lines)
+
+    def write_prometheus(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.prometheus())
+
+    def close(self) -> None:
+        with self.lock:
+            if self.events:
+                self.events.close()
+            self.events = None
+
+
+def get_metrics() -> Metrics:
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+
+def configure_metrics(events_path: Optional[str] = None) -> Metrics:
+    """
+    Replaces the shared metrics (collection starts over), e.g. to write events to events_path.
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is not None:
+            _metrics.close()
+        _metrics = Metrics(events_path)
+        return _metrics
+
+
+def start(path: Optional[str], metrics_format: str = "jsonl") -> None:
+    """
+    Setup for command line scripts: jsonl -> events are written to path while running.
+    """
+    configure_metrics(path if path and metrics_format == "jsonl" else None)
+
+
+def finish(path: Optional[str], metrics_format: str = "jsonl") -> None:
+    """
+    Counterpart of start(): prometheus -> aggregates are written to path.
+    """
+    metrics = get_metrics()
+    if path and metrics_format == "prometheus":
+        metrics.write_prometheus(path)
+    metrics.close()
+
+
+def connected(host: str, seconds: float) -> None:
+    """
+    New connection opened by this thread (name resolution + TCP + TLS handshake took seconds).
+    """
+    _local.connect = seconds
+    get_metrics().observe("connect_seconds", seconds, host=host)
+
+
+def record_request(response, start: float, **fields) -> None:
+    """
+    Records a finished request (body read or discarded).
+    :param start: time.perf_counter() before the request was sent
+    :param fields: added to the event, e.g. attempt number
+    """
+    total = time.perf_counter() - start
+    connect, _local.connect = getattr(_local, "connect", None), None
+    url = str(response.url)
+    host = urlsplit(url).hostname or ""
+    ttfb = response.elapsed.total_seconds() if isinstance(response.elapsed, dt.timedelta) else None
+    size = _received_bytes(response)
+
+    metrics = get_metrics()
+    metrics.increment("requests_total", host=host, status=str(response.status_code))
+    metrics.observe("request_seconds", total, host=host)
+    if ttfb is not None:
+        metrics.observe("ttfb_seconds", ttfb, host=host)
+    metrics.increment("received_bytes_total", size, host=host)
+    metrics.event("request", url=url, status=response.status_code,
+                  connect=round(connect, 6) if connect is not None else None, ttfb=ttfb,
+                  total=round(total, 6), bytes=size, **fields)
+
+
+def record_scan(size: int, seconds: float, full_check: bool = True) -> None:
+    """
+    Html structure check of size bytes took seconds.
+    """
+    metrics = get_metrics()
+    metrics.observe("validator_seconds", seconds)
+    metrics.increment("validator_bytes_total", size)
+    metrics.event("html_check", bytes=size, seconds=round(seconds, 6), full_check=full_check,
+                  mb_per_s=round(size / MB / seconds, 3) if seconds else None)
+
+
+def _received_bytes(response) -> int:
+    """
+    Bytes read from the connection (before decoding), size of the decoded content if not known.
+    """
+    read = getattr(response.raw, "tell", None)
+    size = read() if callable(read) else None
+    if isinstance(size, int):
+        return size
+    content = response.__dict__.get("_content")
+    return len(content) if isinstance(content, bytes) else 0
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
@@ -0,0 +1,73 @@
+"""
+Token bucket rate limiter shared between concurrent download workers.
+Rate adapts to the server: halved when throttled, raised step by step again after successful requests.
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1, max_rate: float = None, min_rate: float = None):
+        """
+        :param rate: average number of requests allowed per second (across all threads)
+        :param burst: number of requests that can be made back to back before limiting kicks in
+        :param max_rate: rate is never raised above this by recover(), defaults to rate
+        :param min_rate: rate is never lowered below this by throttle(), defaults to rate / 16
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = max(max_rate or rate, rate)
+        self.min_rate = min(min_rate or rate / 16, rate)
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Blocks until a token is available, returns time spent waiting (seconds).
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                pause = self.paused_until - self.last_refill
+                if pause <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = max(pause, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+            waited += wait
+
+    def throttle(self, factor: float = 0.5) -> None:
+        """
+        Server asked to slow down (429/503) -> lower the shared rate.
+        """
+        with self.lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * factor)
+
+    def recover(self) -> None:
+        """
+        Successful request -> raise rate by a small step, up to max_rate.
+        """
+        with self.lock:
+            if self.rate < self.max_rate:
+                self._refill()
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def pause(self, seconds: float) -> None:
+        """
+        No request is let through by any thread for seconds (e.g. server sent Retry-After).
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
@@ -0,0 +1,52 @@
+"""
+Retry policy for requests to the archive: jittered exponential backoff, honoring Retry-After
+"""
+import datetime as dt
+import random
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After header (seconds or http date) -> seconds to wait, None if missing/invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=dt.timezone.utc)
+    return max(0.0, (retry_at - dt.datetime.now(dt.timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    def __init__(self, max_retries: int = 5, backoff: float = 1.0, max_backoff: float = 60.0,
+                 max_retry_after: float = 600.0):
+        """
+        :param backoff: base delay, attempt n waits a random time between 0 and backoff * 2**n (full jitter)
+        :param max_backoff: cap of the exponential delay
+        :param max_retry_after: cap of server requested delay (Retry-After)
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        :param attempt: number of the failed attempt, starting from 0
+        :param retry_after: Retry-After header of the failed response
+        """
+        requested = parse_retry_after(retry_after)
+        if requested is not None:
+            return min(requested, self.max_retry_after)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
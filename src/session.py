@@ -0,0 +1,108 @@
+"""
+Shared HTTP session (keep-alive connection pool) used by every network call
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING
+
+from src import metrics
+
+# best compression first, br/zstd are only decodable if brotli / zstd support is installed for urllib3
+ENCODING_PREFERENCE = ["zstd", "br", "gzip", "deflate"]
+
+
+def accept_encoding(encodings=None) -> str:
+    """
+    Accept-Encoding header value: encodings urllib3 can decode here (limited to encodings, if given),
+    in order of preference.
+    """
+    decodable = ACCEPT_ENCODING.split(",")
+    return ", ".join(encoding for encoding in ENCODING_PREFERENCE
+                     if encoding in decodable and (encodings is None or encoding in encodings))
+
+
+DEFAULT_TIMEOUT = 30  # seconds
+DEFAULT_POOL_SIZE = 10
+DEFAULT_HEADERS = {"User-Agent": "webfetcher (+https://github.com/F1End/webfetcher)",
+                   "Accept-Encoding": accept_encoding()}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class _TimedConnect:
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        metrics.connected(self.host, time.perf_counter() - start)
+
+
+class TimedHTTPConnection(_TimedConnect, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnect, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    Records the time new connections take to open (name resolution, TCP and TLS handshake together,
+    urllib3 does not expose them separately), reused keep-alive connections are not timed.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool,
+                                                   "https": TimedHTTPSConnectionPool}
+
+
+class PooledSession(requests.Session):
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT):
+        """
+        :param pool_size: max number of kept-alive connections per host
+        :param timeout: applied to every request that does not set its own timeout
+        """
+        super().__init__()
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.headers.update(DEFAULT_HEADERS)
+        adapter = TimedHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def get_session() -> PooledSession:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = PooledSession()
+        return _session
+
+
+def configure_session(pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT) -> PooledSession:
+    """
+    Replaces the shared session, e.g. to grow the pool to the number of download workers.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = PooledSession(pool_size=pool_size, timeout=timeout)
+        return _session
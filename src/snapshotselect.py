@@ -0,0 +1,154 @@
+"""
+Batched snapshot selection on capture timestamps kept as int64 epoch seconds
+(NumPy arrays when NumPy is installed, stdlib array otherwise)
+"""
+import calendar
+import datetime as dt
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SECONDS_PER_DAY = 86400
+EPOCH = dt.datetime(1970, 1, 1)
+DAYS_IN_MONTH = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+
+def parse_timestamps(timestamps):
+    """
+    yyyymmddhhmmss strings (CDX rows) -> epoch seconds
+    """
+    if np is not None:
+        return _parse_timestamps_np(timestamps)
+    return array("q", (calendar.timegm((int(ts[0:4]), int(ts[4:6]), int(ts[6:8]),
+                                        int(ts[8:10]), int(ts[10:12]), int(ts[12:14])))
+                       for ts in timestamps))
+
+
+def filter_range(epochs, start_date=None, end_date=None):
+    """
+    Keeps captures made on start_date..end_date (both inclusive, either can be None).
+    """
+    start = _day_number(start_date) * SECONDS_PER_DAY if start_date else None
+    end = (_day_number(end_date) + 1) * SECONDS_PER_DAY if end_date else None
+    if np is not None:
+        epochs = np.asarray(epochs, dtype=np.int64)
+        mask = np.ones(len(epochs), dtype=bool)
+        if start is not None:
+            mask &= epochs >= start
+        if end is not None:
+            mask &= epochs < end
+        return epochs[mask]
+    return array("q", (e for e in epochs if (start is None or e >= start) and (end is None or e < end)))
+
+
+def select(epochs, day_of_week=None, day_of_month=None, time_of_day=50):
+    """
+    One capture per week (day_of_week, 1=Monday) or month (day_of_month, shortened to the last day
+    of shorter months) on the requested day, closest to time_of_day (percentage of day).
+    Same outcome as group_snapshots + choose_closest: ties go to the earlier capture in input order.
+    Returns chosen epochs in date order.
+    """
+    target = (time_of_day / 100.0) * SECONDS_PER_DAY
+    if np is not None:
+        return _select_np(np.asarray(epochs, dtype=np.int64), day_of_week, day_of_month, target)
+
+    best = {}
+    for e in epochs:
+        days, secs = divmod(e, SECONDS_PER_DAY)
+        if not _matches_day(days, day_of_week, day_of_month):
+            continue
+        diff = abs(secs - target)
+        if days not in best or diff < best[days][0]:
+            best[days] = (diff, e)
+    return [best[days][1] for days in sorted(best)]
+
+
+def to_datetime(epoch) -> dt.datetime:
+    return EPOCH + dt.timedelta(seconds=int(epoch))
+
+
+def _day_number(date: dt.date) -> int:
+    return (date - EPOCH.date()).days
+
+
+def _matches_day(days, day_of_week, day_of_month):
+    if day_of_week:
+        return (days + 3) % 7 + 1 == day_of_week
+    year, month, day = _civil_from_days(days)
+    return day == min(day_of_month, _days_in_month(year, month))
+
+
+def _days_in_month(year, month):
+    return calendar.monthrange(year, month)[1]
+
+
+def _civil_from_days(days):
+    """
+    Day number since 1970-01-01 -> (year, month, day), integer only so it works on NumPy arrays too
+    (H. Hinnant's days_from_civil inverse)
+    """
+    z = days + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    if np is not None and isinstance(mp, np.ndarray):
+        month = np.where(mp < 10, mp + 3, mp - 9)
+    else:
+        month = mp + 3 if mp < 10 else mp - 9
+    year = yoe + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def _days_from_civil(year, month, day):
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _parse_timestamps_np(timestamps):
+    if len(timestamps) == 0:
+        return np.zeros(0, dtype=np.int64)
+    digits = np.array(timestamps, dtype="S14").view(np.uint8).reshape(-1, 14).astype(np.int64) - ord("0")
+
+    def field(start, end):
+        value = np.zeros(len(digits), dtype=np.int64)
+        for i in range(start, end):
+            value = value * 10 + digits[:, i]
+        return value
+
+    days = _days_from_civil(field(0, 4), field(4, 6), field(6, 8))
+    return days * SECONDS_PER_DAY + field(8, 10) * 3600 + field(10, 12) * 60 + field(12, 14)
+
+
+def _select_np(epochs, day_of_week, day_of_month, target):
+    days = epochs // SECONDS_PER_DAY
+    secs = epochs - days * SECONDS_PER_DAY
+
+    if day_of_week:
+        mask = (days + 3) % 7 + 1 == day_of_week
+    else:
+        year, month, day = _civil_from_days(days)
+        leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+        last_day = np.asarray(DAYS_IN_MONTH)[month - 1] + (leap & (month == 2))
+        mask = day == np.minimum(day_of_month, last_day)
+
+    candidates = np.nonzero(mask)[0]
+    if len(candidates) == 0:
+        return epochs[candidates]
+    candidate_days = days[candidates]
+    diff = np.abs(secs[candidates] - target)
+    # sort by day, then distance from target time, then input position -> first row of each day wins
+    order = np.lexsort((candidates, diff, candidate_days))
+    sorted_days = candidate_days[order]
+    first_of_day = np.ones(len(order), dtype=bool)
+    first_of_day[1:] = sorted_days[1:] != sorted_days[:-1]
+    return epochs[candidates[order[first_of_day]]]
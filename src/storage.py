@@ -0,0 +1,213 @@
+"""
+Writing downloaded content to disk, optionally into a content-addressed (deduplicating) blob store
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+from src import compression
+
+CHUNK_SIZE = 64 * 1024  # bytes
+
+
+class StoredFile(NamedTuple):
+    path: Path
+    size: int  # content size (uncompressed)
+    sha256: str  # of content (uncompressed), of the body as sent for files written by stream_encoded_to_file
+
+
+class StagedFile(NamedTuple):
+    tmp_path: str  # content already written, to be moved into place by finish_staged()
+    path: Path
+    size: int
+    sha256: str
+
+
+class BlobStore:
+    def __init__(self, root: Union[str, Path], compress: Optional[str] = None):
+        """
+        Every distinct content is stored once as root/ab/cdef... (sha256), saved files are hard links to it.
+        :param compress: codec name (see compression.available_codecs()), saved file names get its suffix
+        """
+        self.root = Path(root)
+        self.compress = compress
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, sha256: str) -> Path:
+        return compression.compressed_path(self.root / sha256[:2] / sha256[2:], self.compress)
+
+    def write_chunks(self, chunks, path: Union[str, Path]) -> StoredFile:
+        return self.finish_staged(self.stage_chunks(chunks, path))
+
+    def stage_chunks(self, chunks, path: Union[str, Path]) -> StagedFile:
+        tmp_path, size, sha256 = _write_temp(chunks, self.tmp_dir, compress=self.compress)
+        return StagedFile(tmp_path=tmp_path, path=Path(path), size=size, sha256=sha256)
+
+    def finish_staged(self, staged: StagedFile) -> StoredFile:
+        self._add(staged.tmp_path, staged.sha256)
+        return StoredFile(path=self.link(staged.sha256, staged.path), size=staged.size, sha256=staged.sha256)
+
+    def add_bytes(self, content: bytes, path: Union[str, Path]) -> StoredFile:
+        """
+        Content already in memory: nothing is written if the blob exists.
+        """
+        sha256 = hashlib.sha256(content).hexdigest()
+        if not self.blob_path(sha256).exists():
+            tmp_path, _, _ = _write_temp([content], self.tmp_dir, compress=self.compress,
+                                         expected_size=len(content))
+            self._add(tmp_path, sha256)
+        return StoredFile(path=self.link(sha256, path), size=len(content), sha256=sha256)
+
+    def link(self, sha256: str, path: Union[str, Path]) -> Path:
+        path = compression.compressed_path(path, self.compress)
+        link_file(self.blob_path(sha256), path)
+        return path
+
+    def _add(self, tmp_path: str, sha256: str) -> None:
+        blob = self.blob_path(sha256)
+        if blob.exists():
+            os.unlink(tmp_path)
+            return
+        blob.parent.mkdir(exist_ok=True)
+        os.replace(tmp_path, blob)
+
+
+class BackgroundWriter:
+    def __init__(self, max_pending: int = 4):
+        """
+        Runs writes in one background thread, so the next download starts while the previous file is written.
+        :param max_pending: submit() blocks while this many writes are waiting
+        """
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer")
+        self.slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        """
+        Writes run one by one in submission order.
+        """
+        self.slots.acquire()
+        future = self.executor.submit(func, *args, **kwargs)
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def close(self) -> None:
+        """
+        Waits for the pending writes.
+        """
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream_to_file(response, path: Union[str, Path], chunk_size: int = CHUNK_SIZE,
+                   store: Optional[BlobStore] = None, compress: Optional[str] = None) -> StoredFile:
+    """
+    Writes the body of a streamed response (requests.get(..., stream=True)) chunk by chunk
+    into a temp file next to path, then renames it into place.
+    Size and sha256 are computed while writing, so the body is never held in memory.
+    """
+    return write_chunks(response.iter_content(chunk_size=chunk_size), path, store=store, compress=compress)
+
+
+def stream_encoded_to_file(response, path: Union[str, Path], chunk_size: int = CHUNK_SIZE,
+                           compress: Optional[str] = None) -> StoredFile:
+    """
+    Writes the body of a streamed response as sent by the server, still compressed with its
+    Content-Encoding, if that is a codec saved files can have (path gets the codec suffix).
+    The body is neither decoded nor compressed again. Other encodings are decoded as in stream_to_file.
+    """
+    codec = compression.codec_for_encoding(response.headers.get("Content-Encoding"))
+    if codec is None:
+        return stream_to_file(response, path, chunk_size=chunk_size, compress=compress)
+    path = compression.compressed_path(path, codec.name)
+    chunks = response.raw.stream(chunk_size, decode_content=False)
+    tmp_path, _, sha256 = _write_temp(chunks, path.parent, prefix=f".{path.name}.")
+    os.replace(tmp_path, path)
+    return StoredFile(path=path, size=compression.content_size(path), sha256=sha256)
+
+
+def write_chunks(chunks, path: Union[str, Path], store: Optional[BlobStore] = None,
+                 compress: Optional[str] = None, size: Optional[int] = None) -> StoredFile:
+    """
+    :param compress: codec name, content is written compressed and path gets the codec suffix
+                     (ignored with store, the store decides)
+    :param size: content size if known up front (kept in the zstd header)
+    """
+    return finish_staged(stage_chunks(chunks, path, store=store, compress=compress, size=size), store=store)
+
+
+def stage_chunks(chunks, path: Union[str, Path], store: Optional[BlobStore] = None,
+                 compress: Optional[str] = None, size: Optional[int] = None) -> StagedFile:
+    """
+    First half of write_chunks: content is written into a temp file (next to path, or in the store),
+    finish_staged() moves it into place, e.g. in a BackgroundWriter.
+    """
+    if store is not None:
+        return store.stage_chunks(chunks, path)
+    path = compression.compressed_path(path, compress)
+    tmp_path, size, sha256 = _write_temp(chunks, path.parent, prefix=f".{path.name}.", compress=compress,
+                                         expected_size=size)
+    return StagedFile(tmp_path=tmp_path, path=path, size=size, sha256=sha256)
+
+
+def finish_staged(staged: StagedFile, store: Optional[BlobStore] = None) -> StoredFile:
+    """
+    Second half of write_chunks: renames the temp file into place (or adds it to the store and links path).
+    :param store: the store given to stage_chunks()
+    """
+    if store is not None:
+        return store.finish_staged(staged)
+    os.replace(staged.tmp_path, staged.path)
+    return StoredFile(path=staged.path, size=staged.size, sha256=staged.sha256)
+
+
+def link_file(source: Union[str, Path], target: Union[str, Path], how: str = "hard") -> None:
+    """
+    :param how: "hard" -> hard link (falls back to symlink across filesystems), "symlink" -> symbolic link
+    """
+    source, target = Path(source), Path(target)
+    if target.exists() or target.is_symlink():
+        if target.resolve() == source.resolve():
+            return
+        target.unlink()
+    if how == "hard":
+        try:
+            os.link(source, target)
+            return
+        except OSError:
+            pass
+    os.symlink(source.resolve(), target)
+
+
+def _write_temp(chunks, directory: Union[str, Path], prefix: str = ".", compress: Optional[str] = None,
+                expected_size: Optional[int] = None):
+    """
+    Returns (temp file path, content size, content sha256), temp file is removed on failure.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=prefix, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as raw_file:
+            file = compression.writer(raw_file, compress, size=expected_size) if compress else raw_file
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                file.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+            if compress:
+                file.close()
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path, size, digest.hexdigest()
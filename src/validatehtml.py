@@ -1,9 +1,11 @@
 """
-Checking if a file (received in str) has valid html structure
+Checking if a file (received in str, or as bytes/mmap of an ascii compatible encoding) has valid html structure
 If there are unopened closing tags or unclosed openings -> broken.
 
 """
+import mmap
 import re
+from typing import Union
 
 
 class HTMLStructureError(Exception):
@@ -27,41 +29,196 @@ class HTMLStructureError(Exception):
         return self.msg + self.format_errors()
 
 
+class TagNames(dict):
+    """
+    Tag name as found (str, or bytes of bytes content) -> lower case str, each spelling converted once.
+    """
+    def __missing__(self, name: Union[str, bytes]) -> str:
+        tag = name.lower()
+        if not isinstance(tag, str):
+            tag = tag.decode("ascii")
+        self[name] = tag
+        return tag
+
+
 class ChkHtmlStructure:
     def __init__(self, full_check: bool = True, raise_exception: bool = False):
         """
         :param full_check: if T -> Find all issues and then return/raise exception,
-                           if F -> First issue found will interrupt the script
+                           if F -> Scanning stops at the first issue found, its position is in first_error
         :param raise_exception: if T -> Raises exception
                         if F -> Return dict with errors
         """
-        tag_regex = r"<(/?\w+)[^>]*>"
+        # a tag (name in group 1) or a comment (just "<!--" if it does not end), found by one finditer
+        tag_regex = r"<(?:!--(?:.*?-->)?|(/?\w+)[^>]*>)"
         self.raise_exception = raise_exception
         self.full_check = full_check
-        self.pattern = re.compile(tag_regex)
+        self.pattern = re.compile(tag_regex, re.DOTALL)
         self.self_closing_tags = {"area", "base", "br",
                                   "col", "embed", "hr",
                                   "img", "input", "link",
                                   "meta", "param", "source",
                                   "track", "wbr"}
+        raw_text_end_regex = {tag: rf"</{tag}\s*>" for tag in ("script", "style")}
+        self.raw_text_ends = {tag: re.compile(regex, re.IGNORECASE)
+                              for tag, regex in raw_text_end_regex.items()}
+        # same patterns for bytes input, only tag names get decoded
+        self.bytes_pattern = re.compile(tag_regex.encode(), re.DOTALL)
+        self.bytes_raw_text_ends = {tag: re.compile(regex.encode(), re.IGNORECASE)
+                                    for tag, regex in raw_text_end_regex.items()}
+        self.tag_names = TagNames()
         self.tag_stack = []
         self.errors = {"unclosed_opening": [],
                        "unexpected_closing": []}
+        self.buffer = ""
+        self.in_comment = False
+        self.raw_text = None
+        self.raw_text_start = None  # offset of the open <script>/<style> in the document (fail fast only)
+        self.raw_text_line = None  # its line, once counted
+        self.stopped = False
+        self.first_error = None
+        # position of self.buffer in the whole document (for first_error when fed in chunks)
+        self.offset = 0
+        self.line = 1
 
-    def run_checks(self, html_content: str):
-        cleaned_html_content = self._clean_content(html_content)
-        for match in self.pattern.finditer(cleaned_html_content):
-            tag = match.group(1).lower()
-            self._process_tag(tag)
+    def run_checks(self, html_content: Union[str, bytes, mmap.mmap]):
+        """
+        Checks a whole document in a single pass (comments, script and style content are skipped while scanning).
+        Bytes/mmap content is scanned as is, without decoding or copying the document.
+        """
+        self._scan(html_content, final=True)
+        self._end_in_raw_text(html_content)
         return self._process_outcome()
 
-    def _clean_content(self, html_content: str) -> str:
-        extract_comments = re.sub(r'<!--.*?-->', "", html_content, flags=re.DOTALL)
-        extract_embedded = re.sub(r'<script.*?</script>|<style.*?</style>',
-                                  "", extract_comments, flags=re.DOTALL)
-        return extract_embedded
+    def feed(self, chunk: Union[str, bytes]):
+        """
+        Checks document incrementally (e.g. while downloading), call close() after last chunk.
+        Only an unfinished tag/comment/script ending is kept between chunks.
+        """
+        if self.stopped:
+            return self
+        self.buffer = self.buffer + chunk if self.buffer else chunk
+        consumed = self._scan(self.buffer, final=False)
+        if not self.full_check and not self.stopped:
+            newline = b"\n" if isinstance(self.buffer, bytes) else "\n"
+            raw_text_pos = self.raw_text_start - self.offset if self.raw_text else None
+            if raw_text_pos is not None and self.raw_text_line is None and raw_text_pos < consumed:
+                # start of the open script is dropped from the buffer -> its line is needed now
+                self.raw_text_line = self.line + self.buffer[:raw_text_pos].count(newline)
+            self.offset += consumed
+            self.line += self.buffer[:consumed].count(newline)
+        self.buffer = self.buffer[consumed:]
+        return self
+
+    def close(self):
+        if not self.stopped:
+            self._scan(self.buffer, final=True)
+            self._end_in_raw_text(self.buffer)
+        self.buffer = ""
+        return self._process_outcome()
+
+    def _scan(self, html_content: Union[str, bytes, mmap.mmap], final: bool) -> int:
+        """
+        Processes tags in html_content, returns position up to which content has been consumed
+        (rest has to be rescanned together with the next chunk).
+        Tags are found by one regex, comments and script/style content are jumped over with find/search.
+        """
+        if isinstance(html_content, str):
+            raw_text_ends, comment_end = self.raw_text_ends, "-->"
+        else:
+            raw_text_ends, comment_end = self.bytes_raw_text_ends, b"-->"
+
+        pos = 0
+        length = len(html_content)
+        while True:
+            if self.in_comment:
+                end = html_content.find(comment_end, pos)
+                if end == -1:
+                    return length if final else max(pos, length - 2)
+                pos = end + 3
+                self.in_comment = False
+            elif self.raw_text:
+                end = raw_text_ends[self.raw_text].search(html_content, pos)
+                if end is None:
+                    return length if final else self._raw_text_resume_pos(html_content, pos)
+                pos = end.end()
+                self.raw_text = None
+                self.raw_text_line = None
+            pos = self._scan_tags(html_content, pos, raw_text_ends)
+            if self.stopped:
+                return length
+            if not (self.in_comment or self.raw_text):
+                return pos if final else self._tag_resume_pos(html_content, pos)
+
+    def _scan_tags(self, html_content, pos: int, raw_text_ends: dict) -> int:
+        """
+        Processes tags from pos on, until an unterminated comment or a script/style starts
+        (returns the position after its start) or content ends (returns the end of the last tag).
+        """
+        pattern = self.pattern if isinstance(html_content, str) else self.bytes_pattern
+        tag_names = self.tag_names
+        match = None
+        for match in pattern.finditer(html_content, pos):
+            name = match.group(1)
+            if name is None:
+                if match.end() - match.start() == 4:  # "<!--" not followed by "-->"
+                    self.in_comment = True
+                    return match.end()
+                continue
+            tag = tag_names[name]
+            if tag in raw_text_ends:
+                self.raw_text = tag
+                if not self.full_check:
+                    self.raw_text_start = self.offset + match.start()
+                return match.end()
+            self._process_tag(tag)
+            if self.stopped:
+                self._record_first_error(html_content, match.start(), tag)
+                return match.end()
+        return match.end() if match else pos
+
+    def _tag_resume_pos(self, html_content, pos: int) -> int:
+        # tag may be split between chunks -> keep from the first "<" not followed by any ">"
+        lt, gt = ("<", ">") if isinstance(html_content, str) else (b"<", b">")
+        last_gt = html_content.rfind(gt, pos)
+        start = html_content.find(lt, pos if last_gt == -1 else last_gt + 1)
+        return len(html_content) if start == -1 else start
+
+    def _raw_text_resume_pos(self, html_content, pos: int) -> int:
+        # closing </script> may be split between chunks -> keep from the last "<" (if close to the end)
+        last_open = html_content.rfind("<" if isinstance(html_content, str) else b"<", pos)
+        if last_open != -1 and len(html_content) - last_open < 64:
+            return last_open
+        return len(html_content)
+
+    def _record_first_error(self, html_content, pos: int, tag: str):
+        newline = "\n" if isinstance(html_content, str) else b"\n"
+        self.first_error = {"tag": tag,
+                            "offset": self.offset + pos,
+                            "line": self.line + html_content[:pos].count(newline)}
+
+    def _end_in_raw_text(self, html_content):
+        """
+        Document ended inside <script>/<style> (e.g. download cut off there) -> the tag is unclosed.
+        :param html_content: content scanned last (lines are only counted if the error is reported)
+        """
+        if not self.raw_text:
+            return
+        if self.full_check:
+            self._move_errors_from_stack()
+        self._process_error(self.raw_text, opening_tag=True)
+        if self.stopped:
+            if self.raw_text_line is None:
+                self._record_first_error(html_content, self.raw_text_start - self.offset, self.raw_text)
+            else:
+                self.first_error = {"tag": self.raw_text, "offset": self.raw_text_start, "line": self.raw_text_line}
+        self.raw_text = None
 
     def _process_outcome(self):
+        if self.stopped:
+            # rest of the document was not scanned, open tags are not known to be unclosed
+            self.tag_stack = []
+            self.errors["first_error"] = self.first_error
         self._move_errors_from_stack()
         errors = len(self.errors["unclosed_opening"]) + len(self.errors["unexpected_closing"])
         if errors:
@@ -82,8 +239,7 @@ class ChkHtmlStructure:
     def _process_closing_tag(self, tag: str):
         tag_name = tag[1:]
         tag_stack_empty = not self.tag_stack
-        last_opening_different = self.tag_stack[-1] != tag_name
-        unopened_closing_tag = tag_stack_empty or last_opening_different
+        unopened_closing_tag = tag_stack_empty or self.tag_stack[-1] != tag_name
         if unopened_closing_tag:
             self._process_error(tag, opening_tag=False)
         else:
@@ -95,7 +251,7 @@ class ChkHtmlStructure:
         else:
             self.errors["unexpected_closing"].append(tag)
         if self.full_check is False:
-            self._return_errors()
+            self.stopped = True
 
     def _return_errors(self) -> dict:
         if self.raise_exception:
@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase, main
+
+from src import batchcheck
+
+
+class TestBatchCheck(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp_dir.name)
+        (self.dir / "good.html").write_text("<html><body></body></html>")
+        (self.dir / "broken.html").write_text("<html><body></html>")
+        (self.dir / ".manifest").write_text("{}")
+        (self.dir / "sub").mkdir()
+        (self.dir / "sub" / "nested.html").write_text("<html></html>")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_collect_files(self):
+        # Case 1: directory -> visible files directly in it
+        result = batchcheck.collect_files(str(self.dir))
+        self.assertEqual(result, [str(self.dir / "broken.html"), str(self.dir / "good.html")])
+
+        # Case 2: recursive glob
+        result = batchcheck.collect_files(str(self.dir / "**" / "*.html"))
+        self.assertEqual(result, sorted([str(self.dir / "broken.html"), str(self.dir / "good.html"),
+                                         str(self.dir / "sub" / "nested.html")]))
+
+    def test_check_file(self):
+        # Case 1: passing file
+        result = batchcheck.check_file(str(self.dir / "good.html"), {"html_structure": True}, 0.05)
+        self.assertEqual(result, {"file": str(self.dir / "good.html"), "passed": True, "issues": []})
+
+        # Case 2: failing file, issues are reported as strings
+        result = batchcheck.check_file(str(self.dir / "broken.html"), {"html_structure": True}, 0.05)
+        self.assertFalse(result["passed"])
+        self.assertEqual(len(result["issues"]), 1)
+        self.assertIn("/html", result["issues"][0])
+
+        # Case 3: missing file does not stop the batch
+        result = batchcheck.check_file(str(self.dir / "missing.html"), {"html_structure": True}, 0.05)
+        self.assertFalse(result["passed"])
+        self.assertIn("FileNotFoundError", result["issues"][0])
+
+        # Case 4: fail fast -> first error with its position, later checks are skipped
+        checks = {"html_structure": True, "against_file": str(self.dir / "missing.html")}
+        result = batchcheck.check_file(str(self.dir / "broken.html"), checks, 0.05, fail_fast=True)
+        self.assertFalse(result["passed"])
+        self.assertEqual(len(result["issues"]), 1)
+        self.assertIn("'first_error': {'tag': '/html', 'offset': 12, 'line': 1}", result["issues"][0])
+
+    def test_run_batch(self):
+        files = batchcheck.collect_files(str(self.dir))
+
+        results = batchcheck.run_batch(files, {"html_structure": True}, workers=2)
+        self.assertEqual([r["file"] for r in results], files)
+        self.assertEqual([r["passed"] for r in results], [False, True])
+
+        # Case 2: nothing to check
+        self.assertEqual(batchcheck.run_batch([], {"html_structure": True}), [])
+
+    def test_write_report(self):
+        results = [{"file": "a.html", "passed": True, "issues": []},
+                   {"file": "b.html", "passed": False, "issues": ["x", "y"]}]
+
+        # Case 1: json
+        output = io.StringIO()
+        batchcheck.write_report(results, output, "json")
+        self.assertEqual(json.loads(output.getvalue()), results)
+
+        # Case 2: csv
+        output = io.StringIO()
+        batchcheck.write_report(results, output, "csv")
+        rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+        self.assertEqual(rows[1], {"file": "b.html", "passed": "False", "issues": "x; y"})
+
+        # Case 3: unknown format
+        self.assertRaises(ValueError, batchcheck.write_report, results, output, "xml")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import io
+from contextlib import redirect_stdout
+from unittest import TestCase, main
+
+from benchmarks import generators, run
+from benchmarks.server import LocalServer
+from src import session, validatehtml
+
+
+class TestGenerators(TestCase):
+
+    def test_html(self):
+        # Case 1: same input on every run, valid structure
+        page = generators.html_page(20_000)
+        self.assertEqual(page, generators.html_page(20_000))
+        self.assertGreaterEqual(len(page), 20_000)
+        self.assertIsNone(validatehtml.ChkHtmlStructure().run_checks(page))
+        self.assertIsNone(validatehtml.ChkHtmlStructure().run_checks(generators.deep_nesting(500)))
+        self.assertIsNone(validatehtml.ChkHtmlStructure().run_checks(generators.huge_script(20_000)))
+        self.assertIsNone(validatehtml.ChkHtmlStructure(full_check=False).run_checks(generators.many_scripts(20_000)))
+
+        # Case 2: malformed page has structure errors
+        errors = validatehtml.ChkHtmlStructure().run_checks(generators.malformed(20_000, error_rate=0.1))
+        self.assertTrue(errors["unexpected_closing"] or errors["unclosed_opening"])
+
+    def test_cdx_rows(self):
+        rows = generators.cdx_rows(1000, start_year=2020, years=2)
+        self.assertEqual(len(rows), 1000)
+        self.assertEqual(rows, sorted(rows))
+        self.assertTrue(all(len(ts) == 14 and "2020" <= ts[:4] <= "2021" for ts in rows))
+
+
+class TestRun(TestCase):
+
+    def test_local_server(self):
+        with LocalServer(page_size=1000, compress=True) as server:
+            response = session.PooledSession().get(f"{server.base_url}/page.html")
+        self.assertEqual(response.content, server.server.page)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+
+    def test_compare(self):
+        results = [{"name": "a", "seconds": 1.0}, {"name": "new", "seconds": 2.0}]
+        baseline = {"results": [{"name": "a", "seconds": 2.0}]}
+        output = io.StringIO()
+        with redirect_stdout(output):
+            run.compare(results, baseline)
+        lines = output.getvalue().splitlines()
+        self.assertTrue(lines[1].startswith("a ") and lines[1].endswith("2.00"))
+        self.assertTrue(lines[2].endswith("-"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase, main
+
+from src import cdxcache
+
+
+class TestIndexCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key(self):
+        params = {"filter": "statuscode:200"}
+        cache = cdxcache.IndexCache(self.dir, "example.com", params)
+
+        # Case 1: same url and params -> same file
+        self.assertEqual(cache.path, cdxcache.IndexCache(self.dir, "example.com", dict(params)).path)
+
+        # Case 2: different url or params -> different file
+        self.assertNotEqual(cache.path, cdxcache.IndexCache(self.dir, "example.org", params).path)
+        self.assertNotEqual(cache.path, cdxcache.IndexCache(self.dir, "example.com").path)
+
+        # Case 3: different index server -> different file
+        self.assertNotEqual(cdxcache.IndexCache(self.dir, "example.com", params, cdx_url="http://a/cdx").path,
+                            cdxcache.IndexCache(self.dir, "example.com", params, cdx_url="http://b/cdx").path)
+
+    def test_load_and_append(self):
+        cache = cdxcache.IndexCache(self.dir / "cache", "example.com")
+
+        # Case 1: nothing cached yet
+        self.assertEqual(cache.load(), [])
+        self.assertIsNone(cache.last_timestamp)
+
+        # Case 2: appended rows are loaded back in order
+        cache.append(["20240103120000", "20240110130000"])
+        cache.append([])
+        cache.append(["20240117140000"])
+        reloaded = cdxcache.IndexCache(self.dir / "cache", "example.com")
+        self.assertEqual(reloaded.load(), ["20240103120000", "20240110130000", "20240117140000"])
+        self.assertEqual(reloaded.last_timestamp, "20240117140000")
+
+    def test_truncated_row(self):
+        cache = cdxcache.IndexCache(self.dir, "example.com")
+        cache.append(["20240103120000"])
+        with open(cache.path, "a") as file:
+            file.write("2024011013")
+
+        # Case 1: truncated row is dropped
+        reloaded = cdxcache.IndexCache(self.dir, "example.com")
+        self.assertEqual(reloaded.load(), ["20240103120000"])
+
+        # Case 2: rows appended afterwards are kept
+        reloaded.append(["20240110130000"])
+        self.assertEqual(cdxcache.IndexCache(self.dir, "example.com").load(),
+                         ["20240103120000", "20240110130000"])
+
+
+if __name__ == '__main__':
+    main()
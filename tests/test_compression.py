@@ -0,0 +1,77 @@
+import gzip
+import tempfile
+from pathlib import Path
+from unittest import TestCase, main, skipIf
+from unittest.mock import patch
+
+from src import compression, storage
+
+
+class TestCompression(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "page.html"
+        self.content = b"<html><body>" + b"<p>row</p>" * 1000 + b"</body></html>"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_compressed_path(self):
+        # Case 1: suffix added once
+        self.assertEqual(compression.compressed_path(self.path, "gzip").name, "page.html.gz")
+        self.assertEqual(compression.compressed_path(self.path.with_name("page.html.gz"), "gzip").name,
+                         "page.html.gz")
+
+        # Case 2: no codec -> path unchanged
+        self.assertEqual(compression.compressed_path(self.path, None), self.path)
+
+    @patch("src.compression.zstandard", None)
+    def test_unavailable_codec(self):
+        self.assertEqual(compression.available_codecs(), ["gzip"])
+        with self.assertRaises(ValueError):
+            compression.get_codec("zstd")
+
+    def test_gzip(self):
+        stored = storage.write_chunks([self.content[:100], self.content[100:]], self.path, compress="gzip")
+
+        # Case 1: written compressed, size and hash of content
+        self.assertEqual(stored.path.name, "page.html.gz")
+        self.assertEqual(stored.size, len(self.content))
+        self.assertLess(stored.path.stat().st_size, len(self.content) / 10)
+        self.assertEqual(gzip.decompress(stored.path.read_bytes()), self.content)
+
+        # Case 2: read back transparently, size from trailer
+        self.assertEqual(compression.detect(stored.path), compression.GZIP)
+        with compression.open_read(stored.path) as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertEqual(compression.content_size(stored.path), len(self.content))
+
+        # Case 3: size is counted if file is too large to trust the trailer
+        with patch("src.compression.GZIP_TRAILER_LIMIT", 0):
+            self.assertEqual(compression.content_size(stored.path), len(self.content))
+
+    def test_plain(self):
+        self.path.write_bytes(self.content)
+        self.assertIsNone(compression.detect(self.path))
+        self.assertEqual(compression.content_size(self.path), len(self.content))
+        with compression.open_read(self.path) as file:
+            self.assertEqual(file.read(), self.content)
+
+    @skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        stored = storage.write_chunks([self.content], self.path, compress="zstd", size=len(self.content))
+        streamed = storage.write_chunks(iter([self.content]), self.path.with_name("streamed.html"), compress="zstd")
+
+        # Case 1: size from frame header, or counted when streamed without known size
+        self.assertEqual(stored.path.name, "page.html.zst")
+        self.assertEqual(compression.content_size(stored.path), len(self.content))
+        self.assertEqual(compression.content_size(streamed.path), len(self.content))
+
+        # Case 2: read back transparently
+        with compression.open_read(streamed.path) as file:
+            self.assertEqual(b"".join(iter(lambda: file.read(1024), b"")), self.content)
+
+
+if __name__ == '__main__':
+    main()
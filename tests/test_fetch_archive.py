@@ -1,8 +1,17 @@
+import os
+import tempfile
 import unittest
 import datetime as dt
+from pathlib import Path
 from unittest.mock import patch, MagicMock
 
-from src import fetch_archive
+from benchmarks.mockarchive import Faults, MockArchive
+from src import fetch_archive, metrics, storage
+import requests
+
+from src.manifest import MANIFEST_NAME, Manifest
+from src.retry import RetryPolicy
+from src.storage import StagedFile, StoredFile
 
 
 class TestWaybackFunctions(unittest.TestCase):
@@ -136,49 +145,382 @@ class TestWaybackFunctions(unittest.TestCase):
 
 
 
+class TestFetchSnapshots(unittest.TestCase):
+
+    def _pages(self, session_mock, pages):
+        responses = []
+        for lines in pages:
+            response = MagicMock()
+            response.iter_lines.return_value = iter(lines)
+            responses.append(response)
+        get_mock = session_mock.get_session.return_value.get
+        get_mock.return_value.__enter__.side_effect = responses
+        return get_mock
+
+    @patch("src.fetch_archive.session")
+    def test_iter_cdx_pages(self, session_mock):
+        get_mock = self._pages(session_mock, [
+            ["20240103120000", "20240110130000", "", "resume-key-1"],
+            ["20240117140000"],
+        ])
+
+        pages = list(fetch_archive.iter_cdx_pages({"url": "example.com"}, page_size=2))
+
+        # Case 1: rows of each page, resume key is followed
+        self.assertEqual(pages, [["20240103120000", "20240110130000"], ["20240117140000"]])
+        first_params = get_mock.call_args_list[0].kwargs["params"]
+        second_params = get_mock.call_args_list[1].kwargs["params"]
+        self.assertEqual(first_params["limit"], 2)
+        self.assertEqual(first_params["showResumeKey"], "true")
+        self.assertNotIn("resumeKey", first_params)
+        self.assertEqual(second_params["resumeKey"], "resume-key-1")
+
+        # Case 2: every page request waits for the given rate limiter
+        self._pages(session_mock, [["20240103120000", "", "resume-key-1"], ["20240117140000"]])
+        limiter = MagicMock()
+        limiter.acquire.return_value = 0.0
+        list(fetch_archive.iter_cdx_pages({"url": "example.com"}, page_size=1, rate_limiter=limiter))
+        self.assertEqual(limiter.acquire.call_count, 2)
+
+    @patch("src.fetch_archive.session")
+    def test_fetch_snapshot_index_cache(self, session_mock):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        # Case 1: first run fetches and caches the whole index
+        self._pages(session_mock, [["20240103120000", "20240110130000"]])
+        result = fetch_archive.fetch_snapshot_index("example.com", cache_dir=tmp_dir.name)
+        self.assertEqual(result, ["20240103120000", "20240110130000"])
+
+        # Case 2: next run only asks for captures since last cached one
+        get_mock = self._pages(session_mock, [["20240110130000", "20240117140000"]])
+        result = fetch_archive.fetch_snapshot_index("example.com", cache_dir=tmp_dir.name)
+        self.assertEqual(get_mock.call_args.kwargs["params"]["from"], "20240110130000")
+        self.assertEqual(result, ["20240103120000", "20240110130000", "20240117140000"])
+
+        # Case 3: date range and collapse are sent to the server (and cached separately)
+        get_mock = self._pages(session_mock, [["20240110130000"]])
+        result = fetch_archive.fetch_snapshot_index("example.com", cache_dir=tmp_dir.name,
+                                                    start_date=dt.date(2024, 1, 5), end_date=dt.date(2024, 1, 31),
+                                                    collapse=10)
+        params = get_mock.call_args.kwargs["params"]
+        self.assertEqual(params["from"], "20240105")
+        self.assertEqual(params["to"], "20240131235959")
+        self.assertEqual(params["collapse"], "timestamp:10")
+        self.assertEqual(result, ["20240110130000"])
+
+        # Case 4: datetimes for selection
+        self._pages(session_mock, [[]])
+        result = fetch_archive.fetch_snapshots("example.com", cache_dir=tmp_dir.name)
+        self.assertEqual(result[-1], dt.datetime(2024, 1, 17, 14))
+
+
+class TestRequestWithRetry(unittest.TestCase):
+
+    def _response(self, status_code, headers=None):
+        response = MagicMock()
+        response.status_code = status_code
+        response.headers = headers or {}
+        if status_code >= 400:
+            response.raise_for_status.side_effect = requests.HTTPError(str(status_code))
+        return response
+
+    @patch("src.fetch_archive.time.sleep")
+    @patch("src.fetch_archive.session")
+    def test_request_with_retry(self, session_mock, sleep_mock):
+        enter_mock = session_mock.get_session.return_value.get.return_value.__enter__
+        limiter_mock = MagicMock()
+        limiter_mock.acquire.return_value = 0.0
+        handle_mock = MagicMock(return_value="saved")
+        policy = RetryPolicy(max_retries=3, backoff=0.01)
+
+        # Case 1: throttled with Retry-After, then 5xx, then success
+        enter_mock.side_effect = [self._response(429, {"Retry-After": "7"}), self._response(502),
+                                  self._response(200)]
+        result = fetch_archive.request_with_retry("https://x", handle_mock, rate_limiter=limiter_mock,
+                                                  retry_policy=policy)
+        self.assertEqual(result, "saved")
+        self.assertEqual(limiter_mock.acquire.call_count, 3)
+        limiter_mock.throttle.assert_called_once()
+        limiter_mock.pause.assert_called_once_with(7.0)
+        limiter_mock.recover.assert_called_once()
+        self.assertEqual(sleep_mock.call_args_list[0].args[0], 7.0)
+        self.assertLessEqual(sleep_mock.call_args_list[1].args[0], 0.02)
+        handle_mock.assert_called_once()
+
+        # Case 2: client error is not retried
+        enter_mock.side_effect = [self._response(404)]
+        with self.assertRaises(requests.HTTPError):
+            fetch_archive.request_with_retry("https://x", handle_mock, retry_policy=policy)
+        self.assertEqual(enter_mock.call_count, 4)
+
+        # Case 3: retries exhausted -> last error raised
+        enter_mock.reset_mock()
+        enter_mock.side_effect = requests.ConnectionError("reset")
+        with self.assertRaises(requests.ConnectionError):
+            fetch_archive.request_with_retry("https://x", handle_mock, retry_policy=policy)
+        self.assertEqual(enter_mock.call_count, 4)
+
+
+class TestDownloadSnapshot(unittest.TestCase):
+
+    @patch("src.fetch_archive.storage.stream_to_file")
+    @patch("src.fetch_archive.session")
+    def test_download_snapshot(self, session_mock, stream_mock):
+
+        response_mock = MagicMock()
+        get_mock = session_mock.get_session.return_value.get
+        get_mock.return_value.__enter__.return_value = response_mock
+        limiter_mock = MagicMock()
+        limiter_mock.acquire.return_value = 0.0
+        ts = dt.datetime(2024, 1, 3, 12, 30, 5)
+
+        result = fetch_archive.download_snapshot(ts, "https://example.com", "out", "sample.html", limiter_mock)
+
+        # Case 1: rate limiter is used, archive url is requested as stream
+        limiter_mock.acquire.assert_called_once()
+        get_mock.assert_called_with("https://web.archive.org/web/20240103123005/https://example.com",
+                                    params=None, stream=True)
+        response_mock.raise_for_status.assert_called_once()
+
+        # Case 2: body is streamed into the timestamped file
+        stream_mock.assert_called_with(response_mock, os.path.join("out", "2024-01-03-12-30-05_sample.html"),
+                                       store=None, compress=None)
+        self.assertEqual(result, stream_mock.return_value)
+
+    @patch("src.fetch_archive.time.sleep")
+    @patch("src.fetch_archive.request_with_retry")
+    def test_download_snapshot_default_limiter(self, request_mock, sleep_mock):
+        ts = dt.datetime(2024, 1, 3, 12, 30, 5)
+
+        fetch_archive.download_snapshot(ts, "https://example.com", "out", "sample.html")
+        fetch_archive.download_snapshot(ts, "https://example.com", "out", "sample.html")
+
+        # Case 1: without a limiter the shared default one spaces request starts, no fixed sleep
+        limiters = [c.kwargs["rate_limiter"] for c in request_mock.call_args_list]
+        self.assertIs(limiters[0], fetch_archive.default_rate_limiter())
+        self.assertIs(limiters[0], limiters[1])
+        self.assertAlmostEqual(limiters[0].rate, 1 / fetch_archive.REQUEST_DELAY)
+        sleep_mock.assert_not_called()
+
+
 class TestMain(unittest.TestCase):
 
-    @patch("src.fetch_archive.download_snapshot")
-    @patch("src.fetch_archive.group_snapshots")
-    @patch("src.fetch_archive.filter_date_range")
-    @patch("src.fetch_archive.fetch_snapshots")
+    @patch("src.fetch_archive.stage_snapshot")
+    @patch("src.fetch_archive.fetch_snapshot_index")
     def test_main_execution(
         self,
         mock_fetch,
-        mock_filter,
-        mock_group,
         mock_download
     ):
 
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
         args = MagicMock()
         args.url = "https://example.com"
         args.file_string = "sample.html"
-        args.output_dir = "."
+        args.output_dir = tmp_dir.name
         args.day_of_week = 3
         args.day_of_month = None
         args.time_of_day = 50
         args.start_date = None
-        args.end_date = None
-        args.verbose = False
+        args.end_date = "2024-01-16"
+        args.verbose = True
+        args.workers = 1
+        args.rate = None
+        args.cache_dir = None
+        args.collapse = None
+        args.max_rate = None
+        args.retries = 5
+        args.store = None
+        args.compress = None
+        args.archive_base = None
+
+        mock_fetch.return_value = [
+            "20240103080000",  # Wednesday
+            "20240103120500",  # Wednesday, closest to midday
+            "20240104120000",  # Thursday
+            "20240110130000",  # Wednesday
+            "20240117120000",  # Wednesday, after end_date
+        ]
+        mock_download.side_effect = lambda ts, url, output_dir, file_string, *args, **kwargs: storage.stage_chunks(
+            [b"01234", b"56789"], fetch_archive.snapshot_path(ts, output_dir, file_string))
 
-        ts1 = dt.datetime(2024, 1, 3, 12)
-        ts2 = dt.datetime(2024, 1, 10, 13)
+        with self.assertLogs(level="INFO") as logs:
+            fetch_archive.fetch_from_archive(args)
 
-        mock_fetch.return_value = [ts1, ts2]
-        mock_filter.return_value = [ts1, ts2]
+        # Case 1: index fetched once, with date range
+        mock_fetch.assert_called_once()
+        self.assertEqual(mock_fetch.call_args.kwargs["end_date"], dt.date(2024, 1, 16))
 
-        mock_group.return_value = {
-            (2024, 1): [ts1],
-            (2024, 2): [ts2]
-        }
+        # Case 2: one snapshot downloaded per week
+        self.assertEqual([c.args[0] for c in mock_download.call_args_list],
+                         [dt.datetime(2024, 1, 3, 12, 5), dt.datetime(2024, 1, 10, 13)])
 
-        fetch_archive.fetch_from_archive(args)
+        # Case 3: verbose mode logs discarded snapshots
+        self.assertIn("INFO:root:Discarded 2024-01-03 08:00:00", logs.output)
 
-        # Case 1: fetch_snapshots called
-        mock_fetch.assert_called_once()
+        # Case 4: snapshots written by the background writer and recorded in the manifest
+        saved = Path(tmp_dir.name) / "2024-01-10-13-00-00_sample.html"
+        self.assertEqual(saved.read_bytes(), b"0123456789")
+        self.assertEqual(Manifest(Path(tmp_dir.name) / MANIFEST_NAME).status("20240110130000"), "done")
+
+        # Case 5: index requests and downloads share one rate limiter
+        limiter = mock_fetch.call_args.kwargs["rate_limiter"]
+        self.assertAlmostEqual(limiter.rate, 1 / fetch_archive.REQUEST_DELAY)
+        self.assertTrue(all(c.args[4] is limiter for c in mock_download.call_args_list))
 
-        # Case 2: download_snapshot called for each group
+
+class TestDownloadAll(unittest.TestCase):
+
+    @patch("src.fetch_archive.storage.finish_staged")
+    @patch("src.fetch_archive.stage_snapshot")
+    @patch("src.fetch_archive.download_snapshot")
+    def test_download_all(self, mock_download, mock_stage, mock_finish):
+
+        selected = [dt.datetime(2024, 1, 3, 12), dt.datetime(2024, 1, 10, 13)]
+        mock_stage.side_effect = lambda ts, url, output_dir, file_string, *args, **kwargs: StagedFile(
+            "tmp", Path(fetch_archive.snapshot_path(ts, output_dir, file_string)), 13, "a")
+
+        # Case 1: sequential download shares one rate limiter, files are moved into place in the background
+        fetch_archive.download_all(selected, "https://example.com", ".", "sample.html")
+        self.assertEqual(mock_stage.call_count, 2)
+        limiters = {c.args[4] for c in mock_stage.call_args_list}
+        self.assertEqual(len(limiters), 1)
+        self.assertEqual([c.args[0].path for c in mock_finish.call_args_list],
+                         [Path(".", "2024-01-03-12-00-00_sample.html"),
+                          Path(".", "2024-01-10-13-00-00_sample.html")])
+        mock_download.assert_not_called()
+
+        # Case 2: concurrent download still fetches every snapshot once
+        fetch_archive.download_all(selected, "https://example.com", ".", "sample.html", workers=4, rate=100)
+        self.assertEqual(sorted(c.args[0] for c in mock_download.call_args_list), selected)
+        limiters = {c.args[4] for c in mock_download.call_args_list}
+        self.assertEqual(len(limiters), 1)
+
+        mock_download.reset_mock()
+
+        # Case 3: failed download does not stop the others, run fails at the end
+        mock_download.side_effect = [ConnectionError("503"), StoredFile(Path("b.html"), 1, "b")]
+        with self.assertRaises(RuntimeError):
+            fetch_archive.download_all(selected, "https://example.com", ".", "sample.html", workers=2, rate=100)
         self.assertEqual(mock_download.call_count, 2)
 
-        # Case 3: group_snapshots used
-        mock_group.assert_called_once()
\ No newline at end of file
+        # Case 4: failed write is a failed download
+        mock_finish.side_effect = [OSError("No space left on device"), StoredFile(Path("b.html"), 1, "b")]
+        with self.assertLogs(level="ERROR") as logs, self.assertRaises(RuntimeError):
+            fetch_archive.download_all(selected, "https://example.com", ".", "sample.html")
+        self.assertIn("No space left on device", logs.output[0])
+
+    @patch("src.fetch_archive.stage_snapshot")
+    def test_download_all_resume(self, mock_download):
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        output_dir = Path(tmp_dir.name)
+        selected = [dt.datetime(2024, 1, 3, 12), dt.datetime(2024, 1, 10, 13), dt.datetime(2024, 1, 17, 14)]
+        failing = {selected[1]}
+
+        def fake_stage(ts, url, output_dir, file_string, rate_limiter, retry_policy=None, store=None, compress=None):
+            if ts in failing:
+                raise ConnectionError("503 Service Unavailable")
+            return storage.stage_chunks([b"<html></html>"], fetch_archive.snapshot_path(ts, output_dir, file_string))
+        mock_download.side_effect = fake_stage
+
+        # Case 1: first run, one snapshot fails
+        manifest = Manifest(output_dir / MANIFEST_NAME)
+        with self.assertRaises(RuntimeError):
+            fetch_archive.download_all(selected, "https://example.com", tmp_dir.name, "s.html", manifest=manifest)
+        self.assertEqual(mock_download.call_count, 3)
+
+        # Case 2: rerun (manifest reloaded from disk) retries only the failed snapshot
+        mock_download.reset_mock()
+        failing.clear()
+        manifest = Manifest(output_dir / MANIFEST_NAME)
+        self.assertEqual(manifest.status("20240110130000"), "failed")
+        fetch_archive.download_all(selected, "https://example.com", tmp_dir.name, "s.html", manifest=manifest)
+        self.assertEqual([c.args[0] for c in mock_download.call_args_list], [selected[1]])
+        self.assertEqual(manifest.status("20240110130000"), "done")
+
+        # Case 3: removed file is downloaded again
+        mock_download.reset_mock()
+        (output_dir / "2024-01-03-12-00-00_s.html").unlink()
+        fetch_archive.download_all(selected, "https://example.com", tmp_dir.name, "s.html", manifest=manifest)
+        self.assertEqual([c.args[0] for c in mock_download.call_args_list], [selected[0]])
+
+
+class TestMockArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.archive = MockArchive(rows=2000, page_size=2000,
+                                   faults=Faults(throttle_rate=0.1, error_rate=0.1, retry_after=0))
+        self.archive.__enter__()
+        self.addCleanup(self.archive.__exit__)
+        fetch_archive.configure_archive(self.archive.base_url + "/")
+        self.addCleanup(fetch_archive.configure_archive)
+        self.retry_policy = RetryPolicy(max_retries=10, backoff=0.01, max_backoff=0.05)
+        self.recorder = metrics.configure_metrics()
+        self.addCleanup(metrics.configure_metrics)
+
+    def test_configure_archive(self):
+        self.assertEqual(fetch_archive.CDX_URL, self.archive.base_url + "/cdx/search/cdx")
+        fetch_archive.configure_archive()
+        self.assertEqual(fetch_archive.ARCHIVE_URL, "https://web.archive.org/web/{timestamp}/{url}")
+
+    def test_fetch_and_download(self):
+
+        # Case 1: paged index is complete despite throttled and failed requests
+        index = fetch_archive.fetch_snapshot_index("example.com", page_size=50, start_date=dt.date(2016, 1, 1),
+                                                   end_date=dt.date(2016, 12, 31), retry_policy=self.retry_policy)
+        expected = [ts for ts in self.archive.timestamps if ts.startswith("2016")]
+        self.assertEqual(index, expected)
+        self.assertGreater(self.archive.stats["requests"], len(expected) // 50)
+
+        # Case 2: concurrent download stores every snapshot and records it in the manifest
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        selected = [dt.datetime.strptime(ts, fetch_archive.TIMESTAMP_FORMAT) for ts in index[:20]]
+        manifest = Manifest(Path(tmp_dir.name) / MANIFEST_NAME)
+        fetch_archive.download_all(selected, "example.com", tmp_dir.name, "s.html", workers=4, rate=500,
+                                   manifest=manifest, retry_policy=self.retry_policy)
+        self.assertEqual(self.archive.stats["snapshot"], 20)
+        self.assertTrue(all(manifest.status(ts) == "done" for ts in index[:20]))
+        self.assertEqual(len(os.listdir(tmp_dir.name)), 21)
+
+        # Case 3: every attempt is recorded, failed ones as retries
+        counters = self.recorder.drain()["counters"]
+        attempts = sum(value for (name, _), value in counters.items() if name == "requests_total")
+        self.assertEqual(attempts, self.archive.stats["requests"])
+        self.assertEqual(counters[("retries_total", ())], attempts - self.archive.stats[200])
+
+        # Case 4: sequential download streams to temp files, moved into the store in the background
+        store = storage.BlobStore(Path(tmp_dir.name) / "store")
+        selected = [dt.datetime.strptime(ts, fetch_archive.TIMESTAMP_FORMAT) for ts in index[20:25]]
+        fetch_archive.download_all(selected, "example.com", tmp_dir.name, "s.html", rate=500, manifest=manifest,
+                                   retry_policy=self.retry_policy, store=store)
+        self.assertEqual(self.archive.stats["snapshot"], 25)
+        self.assertTrue(all(manifest.status(ts) == "done" for ts in index[20:25]))
+        self.assertEqual(os.listdir(store.tmp_dir), [])
+
+    def test_archives_share_output_dir(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        other = MockArchive(rows=2000, page_size=1000)
+        other.__enter__()
+        self.addCleanup(other.__exit__)
+        self.archive.faults = Faults()
+
+        args = MagicMock(url="example.com", file_string="s.html", output_dir=tmp_dir.name, day_of_week=1,
+                         day_of_month=None, time_of_day=50, start_date="2016-01-01", end_date="2016-03-31",
+                         verbose=False, workers=1, rate=500, max_rate=None, cache_dir=None, collapse=None,
+                         retries=0, store=None, compress=None)
+        for archive in (self.archive, other):
+            args.archive_base = archive.base_url
+            fetch_archive.fetch_from_archive(args)
+
+        # Case 1: index and snapshots of the second archive are not taken from the first one's cache and manifest
+        self.assertGreater(other.stats["requests"], other.stats["snapshot"])
+        self.assertEqual(other.stats["snapshot"], self.archive.stats["snapshot"])
+        manifest = Manifest(Path(tmp_dir.name) / MANIFEST_NAME)
+        self.assertTrue(all(entry["archive"] == other.base_url for entry in manifest.entries.values()))
@@ -0,0 +1,122 @@
+import gzip
+import io
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import requests
+
+from src import fetchmany
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = f"<html>{self.path}</html>".encode()
+        self.send_response(500 if self.path.startswith("/error") else 200)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestFetchMany(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_read_urls(self):
+        url_file = self.dir / "urls.txt"
+        url_file.write_text("https://a.com/1.html\n\n# comment\n  https://b.com/2.html \nhttps://a.com/1.html\n")
+        expected = ["https://a.com/1.html", "https://b.com/2.html"]
+
+        # Case 1: from file, blank/comment/duplicate lines skipped
+        self.assertEqual(fetchmany.read_urls(str(url_file)), expected)
+
+        # Case 2: from stdin
+        with patch("sys.stdin", io.StringIO(url_file.read_text())):
+            self.assertEqual(fetchmany.read_urls("-"), expected)
+
+    @patch("src.fetchmany.fetch_url")
+    def test_fetch_many_limits(self, fetch_url_mock):
+        lock = threading.Lock()
+        running = {"total": 0, "a.com": 0, "max_total": 0, "max_a.com": 0}
+
+        def fake_fetch(url, **options):
+            host = url.split("/")[2]
+            with lock:
+                running["total"] += 1
+                running[host] = running.get(host, 0) + 1
+                running["max_total"] = max(running["max_total"], running["total"])
+                running[f"max_{host}"] = max(running.get(f"max_{host}", 0), running[host])
+            time.sleep(0.02)
+            with lock:
+                running["total"] -= 1
+                running[host] -= 1
+            if url.endswith("bad"):
+                raise ConnectionError("refused")
+            return url
+        fetch_url_mock.side_effect = fake_fetch
+
+        urls = [f"https://a.com/{i}" for i in range(8)] + [f"https://b{i}.com/x" for i in range(4)] + \
+               ["https://c.com/bad"]
+        results = fetchmany.fetch_many(urls, concurrency=5, per_host=2, output_dir="out")
+
+        # Case 1: every url has a result, failures are returned not raised
+        self.assertEqual(list(results), urls)
+        self.assertEqual(results["https://a.com/3"], "https://a.com/3")
+        self.assertIsInstance(results["https://c.com/bad"], ConnectionError)
+
+        # Case 2: limits are respected
+        self.assertLessEqual(running["max_total"], 5)
+        self.assertLessEqual(running["max_a.com"], 2)
+        self.assertEqual(fetch_url_mock.call_args.kwargs["output_dir"], "out")
+
+        # Case 3: limits below 1 would never start (or fail in) a download
+        for limits in ({"concurrency": 0}, {"per_host": 0}):
+            with self.assertRaises(ValueError):
+                fetchmany.fetch_many(urls, **limits)
+
+    def test_fetch_many_local_server(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        urls = [f"{base}/page{i}.html" for i in range(5)]
+        results = fetchmany.fetch_many(urls, add_timestamp=False, output_dir=str(self.dir), stream=True)
+
+        # Case 1: gzip response is decoded while streaming
+        for i, url in enumerate(urls):
+            self.assertEqual(results[url], self.dir / f"page{i}.html")
+            self.assertEqual(results[url].read_text(), f"<html>/page{i}.html</html>")
+
+        # Case 2: gzip response is saved as received
+        results = fetchmany.fetch_many(urls, add_timestamp=False, output_dir=str(self.dir), keep_encoding=True)
+        for i, url in enumerate(urls):
+            self.assertEqual(results[url], self.dir / f"page{i}.html.gz")
+            self.assertEqual(gzip.decompress(results[url].read_bytes()), f"<html>/page{i}.html</html>".encode())
+
+        # Case 3: error response is a failed download, not saved as the page
+        for stream in (False, True):
+            results = fetchmany.fetch_many([f"{base}/error.html"], add_timestamp=False, output_dir=str(self.dir),
+                                           stream=stream)
+            self.assertIsInstance(results[f"{base}/error.html"], requests.HTTPError)
+            self.assertFalse((self.dir / "error.html").exists())
+
+
+if __name__ == '__main__':
+    main()
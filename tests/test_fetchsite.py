@@ -1,9 +1,12 @@
 
+import tempfile
+from pathlib import Path
 from unittest import TestCase, main
 from unittest.mock import MagicMock, patch
 
+import requests
 
-from src import fetchsite
+from src import fetchsite, httpcache
 
 
 class TestFetchSite(TestCase):
@@ -18,11 +21,12 @@ class TestFetchSite(TestCase):
         self.assertEqual(test_fetch.content_time, default_content_time)
 
     @patch("src.fetchsite.FetchSite._timestamp_content")
-    @patch("src.fetchsite.requests")
-    def test_download_content(self, requests_mock, timestamp_mock):
+    @patch("src.fetchsite.session")
+    def test_download_content(self, session_mock, timestamp_mock):
         response_mock = MagicMock()
         fake_content = "<fake site content>"
         response_mock.content = fake_content
+        requests_mock = session_mock.get_session.return_value
         requests_mock.get.return_value = response_mock
         url = "https://somewebsite.com"
 
@@ -30,7 +34,7 @@ class TestFetchSite(TestCase):
         test_fetch_chain = test_fetch.download_content()  # testing return_self
 
         timestamp_mock.assert_called_once()
-        requests_mock.get.assert_called_with(url)
+        requests_mock.get.assert_called_with(url, headers={})
         self.assertEqual(test_fetch.content, fake_content)
         self.assertEqual(test_fetch, test_fetch_chain)  # testing return_self
 
@@ -57,6 +61,31 @@ class TestFetchSite(TestCase):
         open_mock.assert_called_with(mocked_filepath, "wb")
         file_mock.write.assert_called_with(content_mock)
 
+    @patch("src.fetchsite.storage.stream_to_file")
+    @patch("src.fetchsite.session")
+    @patch("src.fetchsite.FetchSite._format_full_path")
+    @patch("src.fetchsite.FetchSite._timestamp_content")
+    def test_stream_to_file(self, timestamp_mock, format_path_mock, session_mock, stream_mock):
+        mocked_filepath = "some/file/path.txt"
+        format_path_mock.return_value = mocked_filepath
+        response_mock = MagicMock()
+        get_mock = session_mock.get_session.return_value.get
+        get_mock.return_value.__enter__.return_value = response_mock
+        stream_mock.return_value = fetchsite.storage.StoredFile(mocked_filepath, 42, "abc")
+        url = "https://somewebsite.com/somepage.html"
+
+        fetch_test = fetchsite.FetchSite(url)
+        result = fetch_test.stream_to_file(output_dir="some/file", chunk_size=8)
+
+        timestamp_mock.assert_called_once()
+        format_path_mock.assert_called_with(add_timestamp=True, file_name=None, output_dir="some/file")
+        get_mock.assert_called_with(url, stream=True, headers={})
+        stream_mock.assert_called_with(response_mock, mocked_filepath, chunk_size=8, store=None, compress=None)
+        self.assertEqual(result, mocked_filepath)
+        self.assertEqual(fetch_test.size, 42)
+        self.assertEqual(fetch_test.sha256, "abc")
+        self.assertIsNone(fetch_test.content)
+
     @patch("src.fetchsite.Path")
     def test__format_filename(self, path_mock):
         # Setup
@@ -176,5 +205,80 @@ class TestFetchSite(TestCase):
         self.assertEqual(test_fetch.content_time, timestamp)
 
 
+class TestFetchSiteCache(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp_dir.name)
+        self.url = "https://somewebsite.com/somepage.html"
+        self.cache = httpcache.MetadataStore(self.dir / "cache.json")
+        self.previous = self.dir / "previous.html"
+        self.previous.write_bytes(b"<html></html>")
+        self.cache.update(self.url, etag='"v1"', sha256=fetchsite.hashlib.sha256(b"<html></html>").hexdigest(),
+                          path=self.previous)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _response(self, status_code, content=b"", headers=None):
+        response_mock = MagicMock()
+        response_mock.status_code = status_code
+        response_mock.content = content
+        response_mock.headers = headers or {}
+        return response_mock
+
+    @patch("src.fetchsite.session")
+    def test_not_modified(self, session_mock):
+        get_mock = session_mock.get_session.return_value.get
+        get_mock.return_value = self._response(304)
+
+        # Case 1: conditional headers are sent, nothing written on 304
+        fetch_test = fetchsite.FetchSite(self.url, cache=self.cache).download_content()
+        result = fetch_test.to_file(file_name="new.html", output_dir=self.dir)
+        get_mock.assert_called_with(self.url, headers={"If-None-Match": '"v1"'})
+        self.assertIsNone(result)
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir()), ["previous.html"])
+
+        # Case 2: link_unchanged links new name to previous file
+        result = fetch_test.to_file(file_name="new.html", output_dir=self.dir, link_unchanged="hard")
+        self.assertTrue(result.samefile(self.previous))
+
+    @patch("src.fetchsite.session")
+    def test_same_content(self, session_mock):
+        get_mock = session_mock.get_session.return_value.get
+
+        # Case 1: server ignores validators but content hash is unchanged
+        get_mock.return_value = self._response(200, b"<html></html>", {"ETag": '"v2"'})
+        fetch_test = fetchsite.FetchSite(self.url, cache=self.cache).download_content()
+        self.assertIsNone(fetch_test.to_file(file_name="new.html", output_dir=self.dir))
+        self.assertFalse((self.dir / "new.html").exists())
+        self.assertEqual(self.cache.get(self.url)["etag"], '"v2"')
+
+        # Case 2: changed content is saved and becomes the cached file
+        get_mock.return_value = self._response(200, b"<html>new</html>", {"ETag": '"v3"'})
+        fetch_test = fetchsite.FetchSite(self.url, cache=self.cache).download_content()
+        result = fetch_test.to_file(file_name="new.html", output_dir=self.dir)
+        self.assertEqual(result.read_bytes(), b"<html>new</html>")
+        self.assertEqual(self.cache.previous_file(self.url), Path(fetchsite.os.path.abspath(result)))
+
+    @patch("src.fetchsite.session")
+    def test_error_response(self, session_mock):
+        get_mock = session_mock.get_session.return_value.get
+        entry = dict(self.cache.get(self.url))
+
+        # Case 1: error page is neither saved nor cached
+        response = self._response(503, b"<html>busy</html>", {"ETag": '"error"'})
+        response.raise_for_status.side_effect = requests.HTTPError("503 Server Error")
+        get_mock.return_value = response
+        with self.assertRaises(requests.HTTPError):
+            fetchsite.FetchSite(self.url, cache=self.cache).download_content()
+        self.assertEqual(self.cache.get(self.url), entry)
+
+        # Case 2: other non-2xx response (not an error) does not replace the cached entry
+        get_mock.return_value = self._response(300, b"<html>choose</html>", {"ETag": '"choices"'})
+        fetch_test = fetchsite.FetchSite(self.url, cache=self.cache).download_content()
+        fetch_test.to_file(file_name="new.html", output_dir=self.dir)
+        self.assertEqual(self.cache.get(self.url), entry)
+
+
 if __name__ == '__main__':
     main()
@@ -1,7 +1,61 @@
+import gzip
+import hashlib
+import mmap
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
 from unittest import TestCase, main
-from unittest.mock import MagicMock, patch, call
-
-from src import filecheck
+from unittest.mock import MagicMock, patch
+
+from benchmarks import generators
+from src import filecheck, validatehtml
+
+PAGE = b"<html>" + b"x" * 994 + b"</html>"
+
+
+class SizeHandler(BaseHTTPRequestHandler):
+    """
+    /head: HEAD with Content-Length, /range: only ranged GET tells size, /plain: chunked body only (Range
+    ignored), /refuse: chunked body only, ranged GET is refused
+    """
+    requests = []
+
+    def do_HEAD(self):
+        self.requests.append(("HEAD", self.path, self.headers.get("Range")))
+        if self.path != "/head":
+            self.send_response(405)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+
+    def do_GET(self):
+        self.requests.append(("GET", self.path, self.headers.get("Range")))
+        if self.path == "/range" and self.headers.get("Range") == "bytes=0-0":
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes 0-0/{len(PAGE)}")
+            self.send_header("Content-Length", "1")
+            self.end_headers()
+            self.wfile.write(PAGE[:1])
+            return
+        if self.path == "/refuse" and self.headers.get("Range"):
+            self.send_response(416)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(PAGE), 300):
+            chunk = PAGE[start:start + 300]
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
 
 
 class TestFileCheck(TestCase):
@@ -61,30 +115,61 @@ class TestFileCheck(TestCase):
         mock_site_chk.assert_called_with(url)
         mock_html_chk.assert_called_with(html_value)
 
-    @patch('src.filecheck.FileCheck._get_size')
-    def test_check_size(self, get_size_mock):
-        tolerance = 0.05
-        check_content = "Some str of 100 characters"
-        check_against_content = "Some str of 104 characters"
-        self.test_filecheck.tolerance = tolerance
-        self.test_filecheck.check_file_content = check_content
-        self.test_filecheck.check_against_content = check_against_content
+    def test_run_checks_parallel(self):
+        def slow_check(result):
+            def check(param):
+                time.sleep(0.2)
+                return result
+            return check
+
+        self.test_filecheck.check_map = {"html_structure": slow_check("html issue"),
+                                         "against_site": slow_check(None),
+                                         "against_file": slow_check("size issue")}
+        self.test_filecheck.check_type = {"html_structure": True, "against_site": "url", "against_file": "old"}
+
+        # Case 1: checks overlap, issues keep check order
+        start = time.monotonic()
+        with self.assertRaises(Exception) as raised:
+            self.test_filecheck.run_checks()
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(raised.exception.args[0], ["html issue", "size issue"])
+
+        # Case 2: sequential
+        self.test_filecheck.parallel = False
+        start = time.monotonic()
+        with self.assertRaises(Exception):
+            self.test_filecheck.run_checks()
+        self.assertGreaterEqual(time.monotonic() - start, 0.6)
+
+    def test_run_checks_parallel_html(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "page.html"
+            path.write_text(generators.html_page(4_000_000))
+            checker = filecheck.FileCheck(str(path), {"html_structure": True, "against_site": "url"}, tolerance=1)
+            scanned_at_download = []
+
+            def slow_download(url):
+                scanned_at_download.append(True in checker.content._html_errors)
+                time.sleep(0.2)
+                return b"x" * 3_000_000
+
+            # Case 1: site is downloaded while the real html check scans the file
+            with patch.object(checker, "_load_from_url", side_effect=slow_download):
+                checker.run_checks()
+            self.assertEqual(scanned_at_download, [False])
+            self.assertEqual(checker.content._html_errors[True], None)
+
+    def test_check_size(self):
+        self.test_filecheck.tolerance = 0.05
+        self.test_filecheck.check_file_size = 100
 
         # Case 1: Within tolerance
-        get_size_mock.side_effect = [100, 104, 100]
-        expected_calls = [call(check_content), call(check_against_content)]
-        expected_return = None
-        result = self.test_filecheck.check_size()
-        get_size_mock.assert_has_calls(expected_calls)
-        self.assertEqual(result, expected_return)
+        self.test_filecheck.check_against_size = 104
+        self.assertEqual(self.test_filecheck.check_size(), None)
 
         # Case 2: Larger than tolerance
-        get_size_mock.side_effect = [100, 106, 100]
-        expected_calls = [call(check_content), call(check_against_content)]
-        expected_return_2 = 6/100
-        result = self.test_filecheck.check_size()
-        get_size_mock.assert_has_calls(expected_calls)
-        self.assertEqual(result, expected_return_2)
+        self.test_filecheck.check_against_size = 106
+        self.assertEqual(self.test_filecheck.check_size(), 6/100)
 
     @patch('src.filecheck.len')
     def test__get_size(self, len_mock):
@@ -95,21 +180,25 @@ class TestFileCheck(TestCase):
         len_mock.assert_called_with(content)
         self.assertEqual(size, s)
 
-    @patch('src.validatehtml.ChkHtmlStructure')
-    @patch('src.filecheck.FileCheck._load_from_file')
-    def test_check_html(self, load_from_f_mock, chkhtml_mock):
-        instance_mock = MagicMock()
-        chkhtml_mock.return_value = instance_mock
+    @patch('src.filecheck.ContentBuffer.html_errors')
+    def test_check_html(self, html_errors_mock):
         errors = {'unclosed_opening': ['html'], 'unexpected_closing': ['/body']}
-        instance_mock.run_checks.return_value = errors
-        content = "some-html-content"
-        load_from_f_mock.return_value = content
+        html_errors_mock.return_value = errors
 
         html_errors = self.test_filecheck.check_html()
         self.assertEqual(html_errors, errors)
-        chkhtml_mock.assert_called_with(full_check=True)
-        load_from_f_mock.assert_called_with(self.test_filecheck.checked_file)
-        instance_mock.run_checks.assert_called_with(content)
+        html_errors_mock.assert_called_with(True)
+
+    @patch('src.filecheck.FileCheck.check_against_file')
+    def test_run_checks_closes_content(self, check_against_file_mock):
+        check_against_file_mock.side_effect = OSError("missing file")
+        self.test_filecheck.check_map["against_file"] = check_against_file_mock
+        self.test_filecheck.check_type = {"against_file": "old.html"}
+
+        with patch.object(self.test_filecheck.content, "close") as close_mock:
+            with self.assertRaises(OSError):
+                self.test_filecheck.run_checks()
+        close_mock.assert_called_once()
 
     @patch('src.filecheck.FileCheck._load_contents')
     @patch('src.filecheck.FileCheck.check_size')
@@ -177,64 +266,74 @@ class TestFileCheck(TestCase):
         actual_msg = self.test_filecheck._format_size_diff_msg(check_against, ratio)
         self.assertEqual(expected_msg, actual_msg)
 
-    @patch('src.filecheck.FileCheck._load_from_file')
+    @patch('src.filecheck.ContentBuffer.size')
+    @patch('src.filecheck.FileCheck._get_file_size')
     @patch('src.filecheck.FileCheck._load_from_url')
-    def test__load_contents(self, load_url_mock, load_file_mock):
-        # Case 1: Load file + load file
-        load_file_return_values = ["Content_for_first_call", "Content_for_second_call",
-                                   "Content_for_third_call"]
-        load_url_return_value = "Content_from_url"
-        load_file_mock.side_effect = load_file_return_values
-        load_url_mock.return_value = load_url_return_value
-        path_file = "some/path/file.html"
+    def test__load_contents(self, load_url_mock, file_size_mock, buffer_size_mock):
+        # Case 1: File against file -> only sizes, no content is read
+        buffer_size_mock.return_value = 100
+        file_size_mock.return_value = 120
+        load_url_mock.return_value = b"Content_from_url"
         path_old_file = "some/path/old_file.html"
-        expected_file_calls = [call(path_file), call(path_old_file)]
 
-        self.test_filecheck.checked_file = path_file
         self.test_filecheck._load_contents(path_old_file)
-        load_file_mock.assert_has_calls(expected_file_calls)
+        buffer_size_mock.assert_called_once()
+        file_size_mock.assert_called_once_with(path_old_file)
         load_url_mock.assert_not_called()
-        self.assertEqual(self.test_filecheck.check_file_content, load_file_return_values[0])
-        self.assertEqual(self.test_filecheck.check_against_content, load_file_return_values[1])
+        self.assertEqual(self.test_filecheck.check_file_size, 100)
+        self.assertEqual(self.test_filecheck.check_against_size, 120)
 
-        load_file_mock.reset_mock()
+        file_size_mock.reset_mock()
 
-        # Case 2: Load file + load url
-        load_file_return_value = ["Content_for_single_call"]
-        load_file_mock.side_effect = load_file_return_value
+        # Case 2: File against url
         url = "somewebsite.com"
 
         self.test_filecheck._load_contents(url, against_file=False)
-        load_file_mock.assert_called_once()
-        load_file_mock.assert_called_with(path_file)
-        load_url_mock.assert_called_once()
-        load_url_mock.assert_called_with(url)
-        self.assertEqual(self.test_filecheck.check_file_content, load_file_return_value[0])
-        self.assertEqual(self.test_filecheck.check_against_content, load_url_return_value)
-
-    @patch('src.filecheck.open')
-    @patch('src.filecheck.Path')
-    def test__load_from_file(self, path_mock, open_mock):
-        file_mock = MagicMock()
-        fake_content = "<some html file content>"
-        file_mock.read.return_value = fake_content
-        open_mock.return_value.__enter__.return_value = file_mock
-        file_path = "path/to/some/file"
-        path_output = f"Path{file_path}"
-        path_mock.return_value = path_output
-
-        output = self.test_filecheck._load_from_file(file_path)
-        path_mock.assert_called_with(file_path)
-        open_mock.assert_called_with(path_output)
-        file_mock.read.assert_called_once()
-
-        self.assertEqual(output, fake_content)
-
-    @patch('src.filecheck.requests')
-    def test__load_from_url(self, requests_mock):
+        file_size_mock.assert_not_called()
+        load_url_mock.assert_called_once_with(url)
+        self.assertEqual(self.test_filecheck.check_against_content, b"Content_from_url")
+        self.assertEqual(self.test_filecheck.check_against_size, len(b"Content_from_url"))
+
+    def test_compressed_file(self):
+        content = "<html><p>é</p></html>".encode("utf-8")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            plain_path = Path(tmp_dir) / "page.html"
+            plain_path.write_bytes(content)
+            gzip_path = Path(tmp_dir) / "page.html.gz"
+            gzip_path.write_bytes(gzip.compress(content))
+            unnamed_path = Path(tmp_dir) / "page_gzipped.html"
+            unnamed_path.write_bytes(gzip.compress(content))
+
+            # Case 1: uncompressed size of gzip file (by suffix or magic bytes), plain file size
+            for path in (plain_path, gzip_path, unnamed_path):
+                self.assertEqual(self.test_filecheck._get_file_size(path), len(content))
+
+            # Case 2: compressed file compared against plain file
+            checker = filecheck.FileCheck(str(gzip_path), {"against_file": str(plain_path)})
+            self.assertIsNone(checker.check_against_file(str(plain_path)))
+
+            # Case 3: html check on compressed file
+            gzip_path.write_bytes(gzip.compress(b"<html><body></html>" * 10000))
+            checker = filecheck.FileCheck(str(gzip_path), {"html_structure": True})
+            errors = checker.check_html()
+            self.assertEqual(errors["unclosed_opening"][:2], ["html", "body"])
+            self.assertEqual(len(errors["unexpected_closing"]), 10000)
+
+            # Case 4: fail fast stops reading the compressed file at the first error
+            gzip_path.write_bytes(gzip.compress(b"</p>" + b"<p>text</p>" * 100000))
+            checker = filecheck.FileCheck(str(gzip_path), {"html_structure": True}, fail_fast=True)
+            with patch("src.filecheck.validatehtml.ChkHtmlStructure.feed", autospec=True,
+                       side_effect=validatehtml.ChkHtmlStructure.feed) as feed_mock:
+                errors = checker.check_html()
+            self.assertEqual(errors["first_error"]["offset"], 0)
+            feed_mock.assert_called_once()
+
+    @patch('src.session.get_session')
+    def test__load_from_url(self, get_session_mock):
         request_get_mock = MagicMock()
         fake_site_content = "<Some content downloaded from web>"
         request_get_mock.content = fake_site_content
+        requests_mock = get_session_mock.return_value
         requests_mock.get.return_value = request_get_mock
         check_against_url = "some_web_url"
         self.test_filecheck.check_agaist = check_against_url
@@ -243,6 +342,115 @@ class TestFileCheck(TestCase):
         requests_mock.get.assert_called_with(check_against_url)
         self.assertEqual(output, fake_site_content)
 
+    def test__get_remote_size(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SizeHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        # Case 1: HEAD is enough, page is not downloaded
+        SizeHandler.requests = []
+        self.assertEqual(self.test_filecheck._get_remote_size(f"{base}/head"), len(PAGE))
+        self.assertEqual(SizeHandler.requests, [("HEAD", "/head", None)])
+
+        # Case 2: size from Content-Range of a one byte request
+        SizeHandler.requests = []
+        self.assertEqual(self.test_filecheck._get_remote_size(f"{base}/range"), len(PAGE))
+        self.assertEqual(SizeHandler.requests, [("HEAD", "/range", None), ("GET", "/range", "bytes=0-0")])
+
+        # Case 3: Range ignored -> body of the ranged request is counted, no further request
+        SizeHandler.requests = []
+        self.assertEqual(self.test_filecheck._get_remote_size(f"{base}/plain"), len(PAGE))
+        self.assertEqual(SizeHandler.requests, [("HEAD", "/plain", None), ("GET", "/plain", "bytes=0-0")])
+
+        # Case 4: Range refused -> streamed body of a plain request is counted
+        SizeHandler.requests = []
+        self.assertEqual(self.test_filecheck._get_remote_size(f"{base}/refuse"), len(PAGE))
+        self.assertEqual(SizeHandler.requests[-1], ("GET", "/refuse", None))
+
+    @patch('src.filecheck.ContentBuffer.size')
+    @patch('src.filecheck.FileCheck._get_remote_size')
+    @patch('src.filecheck.FileCheck._load_from_url')
+    def test__load_contents_fast_size(self, load_url_mock, remote_size_mock, buffer_size_mock):
+        buffer_size_mock.return_value = 100
+        remote_size_mock.return_value = 103
+        self.test_filecheck.fast_size = True
+        self.test_filecheck.tolerance = 0.05
+
+        self.test_filecheck._load_contents("somewebsite.com", against_file=False)
+        remote_size_mock.assert_called_once_with("somewebsite.com")
+        load_url_mock.assert_not_called()
+        self.assertEqual(self.test_filecheck.check_against_size, 103)
+        self.assertIsNone(self.test_filecheck.check_size())
+
+
+class TestContentBuffer(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = Path(self.tmp_dir.name) / "page.html"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_content(self):
+        content = "<html><p>é</p></html>".encode("utf-8")
+        self.file_path.write_bytes(content)
+        buffer = filecheck.ContentBuffer(self.file_path)
+
+        # Case 1: plain file is mapped once, not copied
+        mapped = buffer.content()
+        self.assertIsInstance(mapped, mmap.mmap)
+        self.assertEqual(mapped[:], content)
+        self.assertIs(buffer.content(), mapped)
+        self.assertEqual(buffer.sha256(), hashlib.sha256(content).hexdigest())
+        buffer.close()
+        self.assertTrue(mapped.closed)
+
+        # Case 2: empty file (cannot be mmapped)
+        self.file_path.write_bytes(b"")
+        self.assertEqual(filecheck.ContentBuffer(self.file_path).content(), b"")
+
+        # Case 3: compressed file is decompressed
+        gzip_path = self.file_path.with_name("page.html.gz")
+        gzip_path.write_bytes(gzip.compress(content))
+        self.assertEqual(filecheck.ContentBuffer(gzip_path).content(), content)
+
+    @patch('src.filecheck.compression.content_size')
+    def test_size(self, content_size_mock):
+        content_size_mock.return_value = 42
+        buffer = filecheck.ContentBuffer(self.file_path)
+
+        # Case 1: size is looked up once, file is not read
+        self.assertEqual(buffer.size(), 42)
+        self.assertEqual(buffer.size(), 42)
+        content_size_mock.assert_called_once_with(self.file_path)
+        self.assertIsNone(buffer._content)
+
+    @patch('src.validatehtml.ChkHtmlStructure')
+    def test_html_errors(self, chkhtml_mock):
+        self.file_path.write_bytes(b"some-html-content")
+        errors = {'unclosed_opening': ['html'], 'unexpected_closing': ['/body']}
+        chkhtml_mock.return_value.run_checks.return_value = errors
+        buffer = filecheck.ContentBuffer(self.file_path)
+
+        # Case 1: result is computed once per full_check mode
+        self.assertEqual(buffer.html_errors(), errors)
+        self.assertEqual(buffer.html_errors(), errors)
+        chkhtml_mock.assert_called_once_with(full_check=True)
+        self.assertEqual(chkhtml_mock.return_value.run_checks.call_args.args[0][:], b"some-html-content")
+        buffer.close()
+
+    def test_html_errors_end_to_end(self):
+        self.file_path.write_bytes(b"<html><body></html>")
+        checker = filecheck.FileCheck(str(self.file_path), {"html_structure": True})
+        self.assertEqual(checker.check_html(), {"unclosed_opening": ["html", "body"],
+                                                "unexpected_closing": ["/html"]})
+        with self.assertRaises(Exception) as raised:
+            checker.run_checks()
+        self.assertEqual(raised.exception.args[0], [checker.check_html()])
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,56 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase, main
+
+from src import httpcache
+
+
+class TestMetadataStore(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp_dir.name)
+        self.store_path = self.dir / "cache.json"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_save_and_load(self):
+        url = "https://somewebsite.com/page.html"
+        store = httpcache.MetadataStore(self.store_path)
+        self.assertEqual(store.get(url), {})
+
+        store.update(url, etag='"abc"', last_modified=None, sha256="123")
+        store.save()
+
+        loaded = httpcache.MetadataStore(self.store_path)
+        self.assertEqual(loaded.get(url), {"etag": '"abc"', "sha256": "123"})
+
+    def test_conditional_headers(self):
+        url = "https://somewebsite.com/page.html"
+        store = httpcache.MetadataStore(self.store_path)
+
+        # Case 1: nothing known about url
+        self.assertEqual(store.conditional_headers(url), {})
+
+        # Case 2: both validators known
+        store.update(url, etag='"abc"', last_modified="Wed, 21 Oct 2015 07:28:00 GMT")
+        self.assertEqual(store.conditional_headers(url),
+                         {"If-None-Match": '"abc"', "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"})
+
+    def test_previous_file(self):
+        url = "https://somewebsite.com/page.html"
+        saved = self.dir / "page.html"
+        store = httpcache.MetadataStore(self.store_path)
+        store.update(url, path=saved)
+
+        # Case 1: file was removed since
+        self.assertIsNone(store.previous_file(url))
+
+        # Case 2: file exists
+        saved.write_text("<html></html>")
+        self.assertEqual(store.previous_file(url), saved)
+
+
+if __name__ == '__main__':
+    main()
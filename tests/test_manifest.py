@@ -0,0 +1,73 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase, main
+
+from src import manifest
+
+
+class TestManifest(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp_dir.name)
+        self.path = self.dir / manifest.MANIFEST_NAME
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_record_and_reload(self):
+        test_manifest = manifest.Manifest(self.path)
+        test_manifest.add_pending(["20240103120000", "20240110130000"])
+        test_manifest.record("20240103120000", manifest.DONE, file="a.html", size=3, sha256="abc")
+
+        # Case 1: last status wins after reload
+        reloaded = manifest.Manifest(self.path)
+        self.assertEqual(reloaded.status("20240103120000"), manifest.DONE)
+        self.assertEqual(reloaded.status("20240110130000"), manifest.PENDING)
+        self.assertIsNone(reloaded.status("20240117140000"))
+
+        # Case 2: add_pending keeps status of known timestamps
+        reloaded.add_pending(["20240103120000"])
+        self.assertEqual(reloaded.status("20240103120000"), manifest.DONE)
+
+    def test_is_complete(self):
+        test_manifest = manifest.Manifest(self.path)
+        test_manifest.record("20240103120000", manifest.DONE, file="a.html", size=3, sha256="abc")
+        test_manifest.record("20240110130000", manifest.FAILED, error="503")
+
+        # Case 1: file missing
+        self.assertFalse(test_manifest.is_complete("20240103120000"))
+
+        # Case 2: file truncated
+        (self.dir / "a.html").write_bytes(b"ab")
+        self.assertFalse(test_manifest.is_complete("20240103120000"))
+
+        # Case 3: file complete
+        (self.dir / "a.html").write_bytes(b"abc")
+        self.assertTrue(test_manifest.is_complete("20240103120000"))
+
+        # Case 4: failed
+        self.assertFalse(test_manifest.is_complete("20240110130000"))
+
+        # Case 5: downloaded from another archive
+        test_manifest.record("20240103120000", manifest.DONE, file="a.html", size=3, sha256="abc",
+                             archive="http://127.0.0.1:8080")
+        self.assertTrue(test_manifest.is_complete("20240103120000", archive="http://127.0.0.1:8080"))
+        self.assertFalse(test_manifest.is_complete("20240103120000", archive="https://web.archive.org"))
+
+    def test_malformed_line(self):
+        test_manifest = manifest.Manifest(self.path)
+        test_manifest.record("20240103120000", manifest.FAILED)
+        with open(self.path, "a") as file:
+            file.write('{"timestamp": "2024011013')
+
+        reloaded = manifest.Manifest(self.path)
+        self.assertEqual(list(reloaded.entries), ["20240103120000"])
+
+        # Case 2: records appended after the broken line are readable
+        reloaded.record("20240110130000", manifest.DONE)
+        self.assertEqual(manifest.Manifest(self.path).status("20240110130000"), manifest.DONE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import datetime as dt
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import TestCase, main
+
+from benchmarks.server import LocalServer
+from src import metrics, session
+
+
+class TestMetrics(TestCase):
+
+    def test_prometheus(self):
+        recorder = metrics.Metrics()
+        recorder.observe("request_seconds", 0.5, host="a.com")
+        recorder.observe("request_seconds", 1.5, host="a.com")
+        recorder.increment("requests_total", host='b"c', status="200")
+        recorder.increment("requests_total", host='b"c', status="200")
+
+        text = recorder.prometheus()
+
+        # Case 1: summary with count, sum and max per label set
+        self.assertIn("# TYPE webfetcher_request_seconds summary\n", text)
+        self.assertIn('webfetcher_request_seconds_count{host="a.com"} 2\n', text)
+        self.assertIn('webfetcher_request_seconds_sum{host="a.com"} 2\n', text)
+        self.assertIn('webfetcher_request_seconds_max{host="a.com"} 1.5\n', text)
+
+        # Case 2: counter, label values escaped
+        self.assertIn("# TYPE webfetcher_requests_total counter\n", text)
+        self.assertIn('webfetcher_requests_total{host="b\\"c",status="200"} 2\n', text)
+
+    def test_events(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        path = os.path.join(tmp_dir.name, "metrics.jsonl")
+
+        # Case 1: no events file -> events are not kept
+        recorder = metrics.Metrics()
+        recorder.event("check", seconds=1)
+        self.assertIsNone(recorder.events)
+
+        # Case 2: one JSON line per event, appended
+        for _ in range(2):
+            recorder = metrics.Metrics(path)
+            recorder.event("check", check="html_structure", seconds=0.25)
+            recorder.close()
+        with open(path) as file:
+            events = [json.loads(line) for line in file]
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0]["event"], "check")
+        self.assertEqual(events[0]["seconds"], 0.25)
+
+    def test_drain_merge(self):
+        worker = metrics.Metrics()
+        worker.observe("check_seconds", 2.0, check="html_structure")
+        worker.increment("validator_bytes_total", 100)
+        parent = metrics.Metrics()
+        parent.observe("check_seconds", 1.0, check="html_structure")
+
+        # Case 1: drained samples are added to the parent's
+        parent.merge(worker.drain())
+        self.assertEqual(parent.summaries[("check_seconds", (("check", "html_structure"),))], [2, 3.0, 2.0])
+        self.assertEqual(parent.counters[("validator_bytes_total", ())], 100)
+
+        # Case 2: drained metrics start over
+        self.assertEqual(worker.prometheus(), "")
+
+    def test_configure_finish(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.addCleanup(metrics.configure_metrics)
+        path = os.path.join(tmp_dir.name, "metrics.prom")
+
+        # Case 1: configure_metrics replaces the shared metrics
+        first = metrics.get_metrics()
+        self.assertIs(first, metrics.get_metrics())
+        metrics.start(path, "prometheus")
+        self.assertIsNot(first, metrics.get_metrics())
+        self.assertIsNone(metrics.get_metrics().events)
+
+        # Case 2: prometheus format is written at the end
+        metrics.record_scan(2 * metrics.MB, 0.5)
+        metrics.finish(path, "prometheus")
+        with open(path) as file:
+            self.assertIn("webfetcher_validator_bytes_total 2.09715e+06\n", file.read())
+
+
+class TestRecordRequest(TestCase):
+
+    def setUp(self):
+        self.recorder = metrics.configure_metrics()
+        self.addCleanup(metrics.configure_metrics)
+
+    def test_record_request(self):
+        response = SimpleNamespace(url="https://a.com/page", status_code=503, elapsed=dt.timedelta(seconds=0.2),
+                                   raw=SimpleNamespace(tell=lambda: 1000))
+
+        metrics.record_request(response, time.perf_counter() - 1.0, attempt=2)
+
+        host = (("host", "a.com"),)
+        self.assertEqual(self.recorder.counters[("requests_total", (("host", "a.com"), ("status", "503")))], 1)
+        self.assertEqual(self.recorder.counters[("received_bytes_total", host)], 1000)
+        self.assertEqual(self.recorder.summaries[("ttfb_seconds", host)], [1, 0.2, 0.2])
+        self.assertGreaterEqual(self.recorder.summaries[("request_seconds", host)][1], 1.0)
+
+    def test_connect(self):
+        test_session = session.PooledSession()
+        self.addCleanup(test_session.close)
+
+        with LocalServer(page_size=10_000) as server:
+            for _ in range(2):
+                start = time.perf_counter()
+                response = test_session.get(server.base_url + "/page.html")
+                metrics.record_request(response, start)
+
+        # Case 1: new connection is timed once, the kept-alive connection is reused
+        host = (("host", "127.0.0.1"),)
+        self.assertEqual(self.recorder.summaries[("connect_seconds", host)][0], 1)
+        self.assertEqual(self.recorder.summaries[("request_seconds", host)][0], 2)
+
+        # Case 2: bytes read from the connection
+        self.assertEqual(self.recorder.counters[("received_bytes_total", host)], 2 * len(response.content))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from src import ratelimit
+
+
+class TestRateLimiter(TestCase):
+
+    def test_init(self):
+        limiter = ratelimit.RateLimiter(2.0, burst=3)
+        self.assertEqual(limiter.rate, 2.0)
+        self.assertEqual(limiter.burst, 3)
+        self.assertEqual(limiter.tokens, 3)
+
+        # Case 2: invalid values
+        self.assertRaises(ValueError, ratelimit.RateLimiter, 0)
+        self.assertRaises(ValueError, ratelimit.RateLimiter, 1, burst=0)
+
+    @patch("src.ratelimit.time")
+    def test_acquire(self, time_mock):
+        clock = [100.0]
+        time_mock.monotonic.side_effect = lambda: clock[0]
+
+        def fake_sleep(seconds):
+            clock[0] += seconds
+        time_mock.sleep.side_effect = fake_sleep
+
+        limiter = ratelimit.RateLimiter(2.0)
+
+        # Case 1: first token is available straight away
+        self.assertEqual(limiter.acquire(), 0)
+        time_mock.sleep.assert_not_called()
+
+        # Case 2: bucket is empty -> waits 1/rate
+        self.assertAlmostEqual(limiter.acquire(), 0.5)
+        time_mock.sleep.assert_called_once_with(0.5)
+
+        time_mock.sleep.reset_mock()
+
+        # Case 3: enough time passed in between -> no wait
+        clock[0] += 10
+        self.assertEqual(limiter.acquire(), 0)
+        time_mock.sleep.assert_not_called()
+
+    def test_throttle_and_recover(self):
+        limiter = ratelimit.RateLimiter(1.0, max_rate=2.0, min_rate=0.2)
+
+        # Case 1: throttled down to min_rate
+        limiter.throttle()
+        self.assertEqual(limiter.rate, 0.5)
+        limiter.throttle()
+        limiter.throttle()
+        self.assertEqual(limiter.rate, 0.2)
+
+        # Case 2: recovers step by step up to max_rate
+        limiter.recover()
+        self.assertAlmostEqual(limiter.rate, 0.3)
+        for _ in range(30):
+            limiter.recover()
+        self.assertEqual(limiter.rate, 2.0)
+
+    @patch("src.ratelimit.time")
+    def test_pause(self, time_mock):
+        clock = [100.0]
+        time_mock.monotonic.side_effect = lambda: clock[0]
+
+        def fake_sleep(seconds):
+            clock[0] += seconds
+        time_mock.sleep.side_effect = fake_sleep
+
+        limiter = ratelimit.RateLimiter(10.0)
+        limiter.pause(30)
+
+        # Case 1: token available but limiter paused
+        self.assertAlmostEqual(limiter.acquire(), 30)
+        self.assertAlmostEqual(clock[0], 130)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import datetime as dt
+from email.utils import format_datetime
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from src import retry
+
+
+class TestRetry(TestCase):
+
+    def test_parse_retry_after(self):
+        # Case 1: missing or invalid
+        self.assertIsNone(retry.parse_retry_after(None))
+        self.assertIsNone(retry.parse_retry_after("soon"))
+
+        # Case 2: seconds
+        self.assertEqual(retry.parse_retry_after(" 120 "), 120.0)
+
+        # Case 3: http date
+        retry_at = dt.datetime.now(dt.timezone.utc) + dt.timedelta(seconds=30)
+        self.assertAlmostEqual(retry.parse_retry_after(format_datetime(retry_at, usegmt=True)), 30, delta=2)
+
+        # Case 4: date in the past
+        self.assertEqual(retry.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+    @patch("src.retry.random.uniform")
+    def test_delay(self, uniform_mock):
+        uniform_mock.side_effect = lambda low, high: high
+        policy = retry.RetryPolicy(backoff=1.0, max_backoff=10.0, max_retry_after=60.0)
+
+        # Case 1: exponential, capped
+        self.assertEqual([policy.delay(attempt) for attempt in range(5)], [1.0, 2.0, 4.0, 8.0, 10.0])
+
+        # Case 2: Retry-After wins, capped
+        self.assertEqual(policy.delay(0, "30"), 30.0)
+        self.assertEqual(policy.delay(0, "3600"), 60.0)
+
+
+if __name__ == '__main__':
+    main()
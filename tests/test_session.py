@@ -0,0 +1,56 @@
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from src import session
+
+
+class TestPooledSession(TestCase):
+
+    def tearDown(self):
+        session._session = None
+
+    def test_init(self):
+        test_session = session.PooledSession(pool_size=4, timeout=7)
+        adapter = test_session.get_adapter("https://web.archive.org")
+
+        self.assertEqual(test_session.pool_size, 4)
+        self.assertEqual(test_session.timeout, 7)
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertIs(adapter, test_session.get_adapter("http://web.archive.org"))
+        self.assertEqual(test_session.headers["User-Agent"], session.DEFAULT_HEADERS["User-Agent"])
+        self.assertEqual(test_session.headers["Accept-Encoding"], session.accept_encoding())
+
+    @patch("src.session.ACCEPT_ENCODING", "gzip,deflate,br")
+    def test_accept_encoding(self):
+        # Case 1: only encodings urllib3 can decode, best first
+        self.assertEqual(session.accept_encoding(), "br, gzip, deflate")
+
+        # Case 2: limited to given encodings
+        self.assertEqual(session.accept_encoding(["gzip", "zstd"]), "gzip")
+
+    @patch("src.session.requests.Session.request")
+    def test_request(self, request_mock):
+        test_session = session.PooledSession(timeout=7)
+
+        # Case 1: default timeout is applied
+        test_session.get("https://somewebsite.com")
+        self.assertEqual(request_mock.call_args.kwargs["timeout"], 7)
+
+        # Case 2: explicit timeout is kept
+        test_session.get("https://somewebsite.com", timeout=1)
+        self.assertEqual(request_mock.call_args.kwargs["timeout"], 1)
+
+    def test_get_session(self):
+        # Case 1: same session is shared between calls
+        first = session.get_session()
+        self.assertIs(first, session.get_session())
+
+        # Case 2: configure_session replaces the shared session
+        configured = session.configure_session(pool_size=20)
+        self.assertIsNot(configured, first)
+        self.assertIs(configured, session.get_session())
+        self.assertEqual(configured.pool_size, 20)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import datetime as dt
+import random
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src import fetch_archive, snapshotselect
+
+
+class TestSnapshotSelect(unittest.TestCase):
+    """
+    Runs with NumPy (when installed) and again with the stdlib fallback, see TestSnapshotSelectNoNumpy.
+    """
+
+    def setUp(self):
+        rng = random.Random(7)
+        start = dt.datetime(1999, 12, 1)
+        timestamps = sorted(start + dt.timedelta(seconds=rng.randrange(0, 30 * 366 * 86400 // 10))
+                            for _ in range(3000))
+        # ties in distance from target time (12:00 +- 1h) on the same day
+        timestamps += [dt.datetime(2004, 2, 29, 11), dt.datetime(2004, 2, 29, 13)]
+        self.timestamps = timestamps
+        self.strings = [ts.strftime(fetch_archive.TIMESTAMP_FORMAT) for ts in timestamps]
+
+    def _expected(self, day_of_week, day_of_month, time_of_day, start_date=None, end_date=None):
+        args = MagicMock()
+        args.day_of_week = day_of_week
+        args.day_of_month = day_of_month
+        timestamps = fetch_archive.filter_date_range(self.timestamps, start_date, end_date)
+        groups = fetch_archive.group_snapshots(timestamps, args)
+        return [fetch_archive.choose_closest(group, time_of_day) for _, group in sorted(groups.items())]
+
+    def _selected(self, day_of_week, day_of_month, time_of_day, start_date=None, end_date=None):
+        epochs = snapshotselect.parse_timestamps(self.strings)
+        epochs = snapshotselect.filter_range(epochs, start_date, end_date)
+        chosen = snapshotselect.select(epochs, day_of_week, day_of_month, time_of_day)
+        return [snapshotselect.to_datetime(e) for e in chosen]
+
+    def test_parse_timestamps(self):
+        epochs = snapshotselect.parse_timestamps(["19700101000000", "20240229235959"])
+        self.assertEqual(list(epochs), [0, int(dt.datetime(2024, 2, 29, 23, 59, 59)
+                                               .replace(tzinfo=dt.timezone.utc).timestamp())])
+        self.assertEqual(len(snapshotselect.parse_timestamps([])), 0)
+
+    def test_filter_range(self):
+        epochs = snapshotselect.parse_timestamps(["20231231235959", "20240101000000", "20240601120000",
+                                                  "20250101000000"])
+
+        # Case 1: both bounds inclusive
+        result = snapshotselect.filter_range(epochs, dt.date(2024, 1, 1), dt.date(2024, 6, 1))
+        self.assertEqual([snapshotselect.to_datetime(e) for e in result],
+                         [dt.datetime(2024, 1, 1), dt.datetime(2024, 6, 1, 12)])
+
+        # Case 2: no bounds
+        self.assertEqual(len(snapshotselect.filter_range(epochs)), 4)
+
+    def test_select_same_as_grouping(self):
+        cases = [(3, None, 50, None, None),
+                 (7, None, 0, dt.date(2003, 1, 1), dt.date(2006, 12, 31)),
+                 (None, 31, 50, None, None),
+                 (None, 29, 100, None, None),
+                 (None, 1, 33, dt.date(2001, 6, 1), None)]
+        for day_of_week, day_of_month, time_of_day, start_date, end_date in cases:
+            expected = self._expected(day_of_week, day_of_month, time_of_day, start_date, end_date)
+            result = self._selected(day_of_week, day_of_month, time_of_day, start_date, end_date)
+            self.assertTrue(expected)
+            self.assertEqual(result, expected)
+
+    def test_select_no_match(self):
+        epochs = snapshotselect.parse_timestamps(["20240104120000"])  # Thursday
+        self.assertEqual(len(snapshotselect.select(epochs, day_of_week=3)), 0)
+
+
+@patch("src.snapshotselect.np", None)
+class TestSnapshotSelectNoNumpy(TestSnapshotSelect):
+    pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest import TestCase, main
+
+ROOT = Path(__file__).resolve().parent.parent
+NETWORK_MODULES = ["requests", "urllib3", "http.client", "ssl"]
+# seconds spent importing the script, on top of a bare interpreter start (best of a few runs)
+STARTUP_BUDGET = {"check": 0.1, "fetch": 0.4, "parse_archive": 0.5}
+
+
+def run_python(code: str) -> str:
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                          check=True).stdout
+
+
+def startup_time(code: str, repeat: int = 5) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_python(code)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class TestStartup(TestCase):
+
+    def test_lazy_network_imports(self):
+        loaded = f"print([name for name in {NETWORK_MODULES} if name in sys.modules])"
+
+        # Case 1: check.py does not import networking libraries
+        self.assertEqual(run_python(f"import sys, check; {loaded}").strip(), "[]")
+
+        # Case 2: loaded with the session, used by checks against a site
+        self.assertEqual(run_python(f"import sys, check\nfrom src import session\n{loaded}").strip(),
+                         str(NETWORK_MODULES))
+
+    def test_startup_budget(self):
+        interpreter = startup_time("pass")
+        for script, budget in STARTUP_BUDGET.items():
+            with self.subTest(script=script):
+                self.assertLess(startup_time(f"import {script}") - interpreter, budget)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from unittest import TestCase, main
+from unittest.mock import MagicMock
+
+from src import storage
+
+
+class TestStreamToFile(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "page.html"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_stream_to_file(self):
+        chunks = [b"<html>", b"", b"<body></body>", b"</html>"]
+        response_mock = MagicMock()
+        response_mock.iter_content.return_value = iter(chunks)
+        content = b"".join(chunks)
+
+        stored = storage.stream_to_file(response_mock, self.path, chunk_size=16)
+
+        response_mock.iter_content.assert_called_with(chunk_size=16)
+        self.assertEqual(stored.path, self.path)
+        self.assertEqual(stored.size, len(content))
+        self.assertEqual(stored.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(self.path.read_bytes(), content)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["page.html"])
+
+    def test_stream_encoded_to_file(self):
+        content = b"<html><body>" + b"<p>row</p>" * 100 + b"</body></html>"
+        body = gzip.compress(content)
+        response_mock = MagicMock()
+        response_mock.raw.stream.return_value = iter([body[:10], body[10:]])
+
+        # Case 1: gzip body is saved as received, size read from gzip trailer
+        response_mock.headers = {"Content-Encoding": "gzip"}
+        stored = storage.stream_encoded_to_file(response_mock, self.path, chunk_size=16)
+        response_mock.raw.stream.assert_called_with(16, decode_content=False)
+        response_mock.iter_content.assert_not_called()
+        self.assertEqual(stored.path, self.path.with_name("page.html.gz"))
+        self.assertEqual(stored.path.read_bytes(), body)
+        self.assertEqual(stored.size, len(content))
+        self.assertEqual(stored.sha256, hashlib.sha256(body).hexdigest())
+
+        # Case 2: encoding that cannot be saved as is -> decoded body
+        response_mock.headers = {"Content-Encoding": "br"}
+        response_mock.iter_content.return_value = iter([content])
+        stored = storage.stream_encoded_to_file(response_mock, self.path, chunk_size=16)
+        self.assertEqual(stored.path, self.path)
+        self.assertEqual(self.path.read_bytes(), content)
+
+    def test_write_chunks_failure(self):
+        self.path.write_bytes(b"previous version")
+
+        def broken_download():
+            yield b"<html>"
+            raise ConnectionError("connection reset")
+
+        # Case 1: existing file is left untouched and temp file is removed
+        with self.assertRaises(ConnectionError):
+            storage.write_chunks(broken_download(), self.path)
+        self.assertEqual(self.path.read_bytes(), b"previous version")
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["page.html"])
+
+    def test_stage_and_finish(self):
+        store = storage.BlobStore(Path(self.tmp_dir.name) / "store")
+
+        # Case 1: staged content is only in a temp file next to path, finish moves it into place
+        staged = storage.stage_chunks([b"<html>", b"</html>"], self.path)
+        self.assertFalse(self.path.exists())
+        self.assertEqual(Path(staged.tmp_path).parent, self.path.parent)
+        stored = storage.finish_staged(staged)
+        self.assertEqual((stored.path, stored.size), (self.path, 13))
+        self.assertEqual(self.path.read_bytes(), b"<html></html>")
+        self.assertFalse(os.path.exists(staged.tmp_path))
+
+        # Case 2: with a store the temp file is in the store, finish adds the blob and links path
+        staged = storage.stage_chunks([b"<html></html>"], self.path.with_name("linked.html"), store=store)
+        self.assertEqual(Path(staged.tmp_path).parent, store.tmp_dir)
+        stored = storage.finish_staged(staged, store=store)
+        self.assertTrue(os.path.samefile(stored.path, store.blob_path(stored.sha256)))
+        self.assertEqual(os.listdir(store.tmp_dir), [])
+
+
+class TestBackgroundWriter(TestCase):
+
+    def test_background_writer(self):
+        done = []
+        release = threading.Event()
+
+        with storage.BackgroundWriter(max_pending=2) as writer:
+            writer.submit(lambda: release.wait(5) and done.append(1))
+            writer.submit(done.append, 2)
+
+            # Case 1: max_pending writes waiting -> submit blocks until one is done
+            blocked = threading.Thread(target=writer.submit, args=(done.append, 3))
+            blocked.start()
+            blocked.join(0.1)
+            self.assertTrue(blocked.is_alive())
+            release.set()
+            blocked.join(5)
+            self.assertFalse(blocked.is_alive())
+
+        # Case 2: writes run in submission order, all done on exit
+        self.assertEqual(done, [1, 2, 3])
+
+
+class TestLinkFile(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source = Path(self.tmp_dir.name) / "source.html"
+        self.source.write_text("<html></html>")
+        self.target = Path(self.tmp_dir.name) / "target.html"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_link_file(self):
+        # Case 1: hard link
+        storage.link_file(self.source, self.target)
+        self.assertTrue(os.path.samefile(self.source, self.target))
+        self.assertFalse(self.target.is_symlink())
+
+        # Case 2: symlink replaces existing target
+        storage.link_file(self.source, self.target, how="symlink")
+        self.assertTrue(self.target.is_symlink())
+        self.assertEqual(self.target.read_text(), "<html></html>")
+
+
+class TestBlobStore(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        self.content = b"<html><body>same</body></html>"
+        self.sha256 = hashlib.sha256(self.content).hexdigest()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_deduplicate(self):
+        store = storage.BlobStore(self.root / "store")
+
+        first = storage.write_chunks([self.content], self.root / "first.html", store=store)
+        second = store.add_bytes(self.content, self.root / "second.html")
+        other = store.add_bytes(b"<html>other</html>", self.root / "other.html")
+
+        # Case 1: identical content is stored once, saved files are hard links to the blob
+        blob = store.blob_path(self.sha256)
+        self.assertEqual(blob, self.root / "store" / self.sha256[:2] / self.sha256[2:])
+        self.assertTrue(os.path.samefile(first.path, blob))
+        self.assertTrue(os.path.samefile(second.path, blob))
+        self.assertEqual((first.size, first.sha256), (len(self.content), self.sha256))
+        self.assertEqual(second.sha256, self.sha256)
+
+        # Case 2: different content gets its own blob, no temp files left behind
+        self.assertFalse(os.path.samefile(other.path, blob))
+        self.assertEqual(os.listdir(store.tmp_dir), [])
+
+    def test_compressed(self):
+        store = storage.BlobStore(self.root / "store", compress="gzip")
+
+        stored = store.write_chunks([self.content[:10], self.content[10:]], self.root / "page.html")
+
+        # Case 1: saved name gets .gz suffix, size and hash are of the uncompressed content
+        self.assertEqual(stored.path, self.root / "page.html.gz")
+        self.assertEqual((stored.size, stored.sha256), (len(self.content), self.sha256))
+        self.assertEqual(gzip.decompress(stored.path.read_bytes()), self.content)
+
+        # Case 2: same content again is not rewritten
+        blob = store.blob_path(self.sha256)
+        mtime = blob.stat().st_mtime_ns
+        store.add_bytes(self.content, self.root / "again.html")
+        self.assertEqual(blob.stat().st_mtime_ns, mtime)
+        self.assertTrue(os.path.samefile(self.root / "again.html.gz", blob))
+
+
+if __name__ == '__main__':
+    main()
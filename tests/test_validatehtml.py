@@ -1,6 +1,5 @@
 from unittest import TestCase, main
 from unittest.mock import MagicMock, patch, call
-import re
 
 from src import validatehtml
 
@@ -48,7 +47,7 @@ class TestHTMLStructureError(TestCase):
     def test_init(self, re_mock):
         fake_reg_compl = "compiled re"
         re_mock.compile.return_value = fake_reg_compl
-        expected_regex_call = r'<(/?\w+)[^>]*>'
+        expected_regex_call = r'<(?:!--(?:.*?-->)?|(/?\w+)[^>]*>)'
         default_check = True
         default_exception = False
         expected_closing_tags = set(("area", "base", "br",
@@ -61,56 +60,125 @@ class TestHTMLStructureError(TestCase):
                           "unexpected_closing": []}
         test_validator = validatehtml.ChkHtmlStructure()
 
-        re_mock.compile.assert_called_with(expected_regex_call)
+        re_mock.compile.assert_any_call(expected_regex_call, re_mock.DOTALL)
         self.assertEqual(test_validator.raise_exception, default_exception)
         self.assertEqual(test_validator.full_check, default_check)
         self.assertEqual(test_validator.pattern, fake_reg_compl)
         self.assertEqual(test_validator.self_closing_tags, expected_closing_tags)
         self.assertEqual(test_validator.tag_stack, default_stack_value)
         self.assertEqual(test_validator.errors, default_errors)
+        self.assertEqual(set(test_validator.raw_text_ends), {"script", "style"})
+        self.assertEqual(test_validator.buffer, "")
 
-    @patch("src.validatehtml.ChkHtmlStructure._clean_content")
     @patch("src.validatehtml.ChkHtmlStructure._process_tag")
     @patch("src.validatehtml.ChkHtmlStructure._process_outcome")
-    def test_run_checks(self, mock_process_outcome, mock_process_tag, mock_clean_content):
-        preproccessed_html_content = """<some> <!--<var 12 />--> </html> <content>"""
-        fake_html_cotent = """<some>  </html> <content>"""
-        mock_clean_content.return_value = fake_html_cotent
-        match_mock1, match_mock2, match_mock3 = MagicMock(), MagicMock(), MagicMock()
-        group_mock = MagicMock()
-        fake_tag_call_args = ["tag1", "tag2", "tag3"]
-        group_mock.lower.side_effect = fake_tag_call_args
-        match_mock1.group.return_value = group_mock
-        match_mock2.group.return_value = group_mock
-        match_mock3.group.return_value = group_mock
-        self.test_checker.pattern.finditer.return_value = [match_mock1, match_mock2, match_mock3]
-
-        self.test_checker.run_checks(preproccessed_html_content)
-        self.test_checker.pattern.finditer.assert_called_with(fake_html_cotent)
-        match_mock1.group.assert_called_with(1)
-        match_mock2.group.assert_called_with(1)
-        match_mock3.group.assert_called_with(1)
-        self.assertEqual(group_mock.lower.call_count, 3)
-        mock_process_tag.assert_has_calls([call(fake_tag_call_args[0]),
-                                          call(fake_tag_call_args[1]),
-                                          call(fake_tag_call_args[2])])
+    def test_run_checks(self, mock_process_outcome, mock_process_tag):
+        checker = validatehtml.ChkHtmlStructure()
+        html_content = """<HTML><!--<var 12 />--> <script type="x">if (a<b) {s="</div>"}</SCRIPT>""" \
+                       """<style>p > a {}</style>< notatag> <br/></html>"""
+
+        checker.run_checks(html_content)
+        mock_process_tag.assert_has_calls([call("html"), call("br"), call("/html")])
+        self.assertEqual(mock_process_tag.call_count, 3)
         mock_process_outcome.assert_called_once()
-        mock_clean_content.assert_called_with(preproccessed_html_content)
-
-    @patch("src.validatehtml.re.sub")
-    def test__clean_content(self, re_mock):
-        regex_1 = r'<!--.*?-->'
-        regex_2 = r'<script.*?</script>|<style.*?</style>'
-        input_content = "some content as unprocessed input"
-        returned_1 = "After comment extration"
-        returned_2 = "After script/style internal tag extraction"
-        re_mock.side_effect = [returned_1, returned_2]
-        expected_calls = [call(regex_1, "", input_content, flags=re.DOTALL),
-                          call(regex_2, "", returned_1, flags=re.DOTALL)]
-
-        cleaned = self.test_checker._clean_content(input_content)
-        self.assertEqual(cleaned, returned_2)
-        re_mock.assert_has_calls(expected_calls)
+
+    def test_run_checks_outcome(self):
+        # Case 1: valid document
+        html_content = "<html><head><title>t</title></head><body><img src=x><p>text</p></body></html>"
+        self.assertIsNone(validatehtml.ChkHtmlStructure().run_checks(html_content))
+
+        # Case 2: unexpected closing on empty stack and unclosed opening
+        errors = validatehtml.ChkHtmlStructure().run_checks("</p><div>")
+        self.assertEqual(errors, {"unclosed_opening": ["div"], "unexpected_closing": ["/p"]})
+
+        # Case 3: unterminated comment hides the rest of the document
+        errors = validatehtml.ChkHtmlStructure().run_checks("<div><!-- </div>")
+        self.assertEqual(errors, {"unclosed_opening": ["div"], "unexpected_closing": []})
+
+    def test_feed(self):
+        html_content = """<html><head><script>var a = "<!-- </script>\n<style>p{}</style></head>""" \
+                       """<body><!-- <div> --><p class="x">text</p></body></HTML>"""
+        expected = validatehtml.ChkHtmlStructure().run_checks(html_content + "<div>")
+
+        # Case 1: any chunking gives the same outcome as a single run_checks
+        for chunk_size in (1, 2, 3, 5, 8, 13):
+            checker = validatehtml.ChkHtmlStructure()
+            for i in range(0, len(html_content), chunk_size):
+                checker.feed(html_content[i:i + chunk_size])
+            checker.feed("<div>")
+            self.assertEqual(checker.close(), expected)
+            self.assertEqual(checker.buffer, "")
+
+        # Case 2: only unfinished tag is kept between chunks
+        checker = validatehtml.ChkHtmlStructure()
+        checker.feed("<html>" + "text " * 100 + "<bo")
+        self.assertEqual(checker.buffer, "<bo")
+        self.assertEqual(checker.tag_stack, ["html"])
+        checker.feed("dy></body>")
+        self.assertEqual(checker.buffer, "")
+
+    def test_fail_fast(self):
+        html_content = "<html>\n<body>\n<p>text</div>\n" + "<div></span>" * 1000 + "</body>\n</html>"
+        expected_first = {"tag": "/div", "offset": html_content.index("</div>"), "line": 3}
+
+        # Case 1: scanning stops at first error, rest of the document is ignored
+        checker = validatehtml.ChkHtmlStructure(full_check=False)
+        errors = checker.run_checks(html_content)
+        self.assertEqual(errors, {"unclosed_opening": [], "unexpected_closing": ["/div"],
+                                  "first_error": expected_first})
+        self.assertEqual(checker.first_error, expected_first)
+
+        # Case 2: same position when fed in chunks (str and bytes)
+        for content in (html_content, html_content.encode()):
+            checker = validatehtml.ChkHtmlStructure(full_check=False)
+            for i in range(0, len(content), 7):
+                checker.feed(content[i:i + 7])
+            self.assertEqual(checker.close()["first_error"], expected_first)
+            self.assertEqual(checker.buffer, "")
+
+        # Case 3: unclosed tags are only found at the end, no first_error position
+        errors = validatehtml.ChkHtmlStructure(full_check=False).run_checks("<html><body></body>")
+        self.assertEqual(errors, {"unclosed_opening": ["html"], "unexpected_closing": []})
+
+    def test_unclosed_raw_text(self):
+        html_content = "<html><body></body></html>\n<script>var a = '<div>"
+
+        # Case 1: document ending inside a script is reported as unclosed (str, bytes, chunks)
+        expected = {"unclosed_opening": ["script"], "unexpected_closing": []}
+        self.assertEqual(validatehtml.ChkHtmlStructure().run_checks(html_content), expected)
+        self.assertEqual(validatehtml.ChkHtmlStructure().run_checks(html_content.encode()), expected)
+        checker = validatehtml.ChkHtmlStructure()
+        for i in range(0, len(html_content), 5):
+            checker.feed(html_content[i:i + 5])
+        self.assertEqual(checker.close(), expected)
+
+        # Case 2: after tags that are still open
+        errors = validatehtml.ChkHtmlStructure().run_checks("<html><body><style>p {")
+        self.assertEqual(errors["unclosed_opening"], ["html", "body", "style"])
+
+        # Case 3: fail fast stops with the position of the script
+        checker = validatehtml.ChkHtmlStructure(full_check=False)
+        for i in range(0, len(html_content), 5):
+            checker.feed(html_content[i:i + 5].encode())
+        errors = checker.close()
+        self.assertTrue(checker.stopped)
+        self.assertEqual(errors["first_error"], {"tag": "script", "offset": 27, "line": 2})
+        errors = validatehtml.ChkHtmlStructure(full_check=False).run_checks(html_content)
+        self.assertEqual(errors["first_error"], {"tag": "script", "offset": 27, "line": 2})
+
+    def test_run_checks_bytes(self):
+        html_content = """<html><body><!-- <div> --><script>a = "</p>"</script><p>é</p></body></html>"""
+        expected = validatehtml.ChkHtmlStructure().run_checks(html_content + "<div>")
+
+        # Case 1: bytes give same outcome as str
+        encoded = (html_content + "<div>").encode("utf-8")
+        self.assertEqual(validatehtml.ChkHtmlStructure().run_checks(encoded), expected)
+
+        # Case 2: bytes chunks fed incrementally
+        checker = validatehtml.ChkHtmlStructure()
+        for i in range(0, len(encoded), 3):
+            checker.feed(encoded[i:i + 3])
+        self.assertEqual(checker.close(), expected)
 
     @patch("src.validatehtml.ChkHtmlStructure._move_errors_from_stack")
     @patch("src.validatehtml.ChkHtmlStructure._return_errors")
@@ -215,13 +283,15 @@ class TestHTMLStructureError(TestCase):
         self.test_checker.errors["unexpected_closing"] = []
         self.test_checker.errors["unexpected_closing"] = []
 
-        # Case 3: Full check is true
+        # Case 3: Full check is false -> scanning stops, errors are returned by _process_outcome
+        self.assertFalse(self.test_checker.stopped)
         self.test_checker.full_check = False
         tag = "<body>"
         self.test_checker._process_error(tag, opening_tag=True)
         self.assertEqual(self.test_checker.errors["unclosed_opening"], [tag])
         self.assertEqual(self.test_checker.errors["unexpected_closing"], [])
-        return_err_mock.assert_called_once()
+        self.assertTrue(self.test_checker.stopped)
+        return_err_mock.assert_not_called()
         # reset setUp
         self.test_checker.errors["unclosed_opening"] = []
         self.test_checker.errors["unexpected_closing"] = []